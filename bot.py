@@ -20,8 +20,15 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ethiostore.settings")
 django.setup()
 
 from config import bot_config, app_config
+from database.counters import counter_buffer
 from database.db import init_db
+from database.identity_map import install_identity_map
+from utils.edit_coalescer import keyboard_edits
+from utils.image_pool import image_pool
 from utils.logger import logger
+from utils.outbound import install_outbound_limiter
+from utils.query_budget import install_query_budget
+from utils.update_dedup import install_update_dedup
 
 # Import routers
 from features.onboarding import router as onboarding_router
@@ -29,6 +36,7 @@ from features.products import router as products_router
 from features.inline_search import router as inline_router
 from features.engagement import router as engagement_router
 from features.scheduler import router as scheduler_router, start_scheduler, stop_scheduler
+from features.admin import router as admin_router
 
 # Test router for multiple images with inline buttons
 test_router = Router()
@@ -140,6 +148,9 @@ async def on_startup(bot: Bot):
         logger.error(f"❌ Failed to initialize database: {e}")
         sys.exit(1)
     
+    # Polling runs on one long-lived loop: keyboard edits may be delayed on it
+    keyboard_edits.register_loop()
+    
     # Start scheduler
     try:
         start_scheduler(bot)
@@ -181,6 +192,19 @@ async def on_shutdown(bot: Bot):
     except Exception as e:
         logger.error(f"⚠️ Error stopping scheduler: {e}")
     
+    # Flush buffered likes/saves
+    try:
+        await asyncio.to_thread(counter_buffer.stop)
+        logger.info("✅ Engagement counters flushed")
+    except Exception as e:
+        logger.error(f"⚠️ Error flushing engagement counters: {e}")
+    
+    # Let in-flight image jobs finish
+    try:
+        await asyncio.to_thread(image_pool.shutdown)
+    except Exception as e:
+        logger.error(f"⚠️ Error stopping image pool: {e}")
+    
     await bot.session.close()
     logger.info("✅ Bot stopped gracefully")
 
@@ -193,9 +217,17 @@ async def main():
             parse_mode=ParseMode.MARKDOWN
         )
     )
+    # Pace every outgoing call (global/per-chat limits, retry-after)
+    install_outbound_limiter(bot)
     
     # Create dispatcher
     dp = Dispatcher()
+    # Drop redelivered updates before any other work
+    install_update_dedup(dp)
+    # Count DB queries per update and flag handlers over budget
+    install_query_budget(dp)
+    # Load each user/product at most once per update
+    install_identity_map(dp)
     
     # Register routers
     dp.include_router(onboarding_router)
@@ -203,6 +235,7 @@ async def main():
     dp.include_router(inline_router)
     dp.include_router(engagement_router)
     dp.include_router(scheduler_router)
+    dp.include_router(admin_router)
     dp.include_router(test_router)
     
     # Register startup/shutdown handlers
@@ -42,6 +42,45 @@ class AppConfig:
     PREMIUM_PRICE_BIRR: int = int(os.getenv("PREMIUM_PRICE_BIRR", "500"))
     WATERMARK_FONT_SIZE: int = int(os.getenv("WATERMARK_FONT_SIZE", "24"))
     WATERMARK_OPACITY: int = int(os.getenv("WATERMARK_OPACITY", "180"))
+    INLINE_PAGE_SIZE: int = int(os.getenv("INLINE_PAGE_SIZE", "10"))
+    INLINE_CACHE_SIZE: int = int(os.getenv("INLINE_CACHE_SIZE", "512"))
+    INLINE_CACHE_TTL: int = int(os.getenv("INLINE_CACHE_TTL", "60"))  # seconds
+    COUNTER_FLUSH_INTERVAL: float = float(os.getenv("COUNTER_FLUSH_INTERVAL", "5"))  # seconds, 0 = write-through
+    COUNTER_FLUSH_EVENTS: int = int(os.getenv("COUNTER_FLUSH_EVENTS", "200"))
+    KEYBOARD_EDIT_WINDOW: float = float(os.getenv("KEYBOARD_EDIT_WINDOW", "3"))  # seconds between edits of one message
+    OUTBOUND_GLOBAL_RATE: float = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # messages/second for the bot
+    OUTBOUND_CHAT_RATE: float = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # per private chat
+    OUTBOUND_GROUP_RATE: float = float(os.getenv("OUTBOUND_GROUP_RATE", "0.33"))  # per group/channel (~20/min)
+    OUTBOUND_CHAT_BURST: float = float(os.getenv("OUTBOUND_CHAT_BURST", "4"))  # back-to-back messages per private chat
+    OUTBOUND_MAX_RETRIES: int = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+    OUTBOUND_MAX_RETRY_WAIT: float = float(os.getenv("OUTBOUND_MAX_RETRY_WAIT", "30"))  # total retry_after seconds per call
+    OUTBOUND_PROCESSES: int = int(os.getenv("WEB_CONCURRENCY", "1"))  # worker processes sharing OUTBOUND_GLOBAL_RATE
+    SCHEDULER_CONCURRENCY: int = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))  # parallel autoposts
+    SCHEDULE_CLAIM_TTL: int = int(os.getenv("SCHEDULE_CLAIM_TTL", "900"))  # seconds a worker may hold a lease
+    SCHEDULE_CLAIM_BATCH: int = int(os.getenv("SCHEDULE_CLAIM_BATCH", "200"))
+    SCHEDULER_RESYNC_INTERVAL: int = int(os.getenv("SCHEDULER_RESYNC_INTERVAL", "1800"))  # seconds between full reloads
+    SCHEDULER_RETRY_DELAY: int = int(os.getenv("SCHEDULER_RETRY_DELAY", "300"))  # seconds before retrying a failed post
+    SCHEDULER_POLL_INTERVAL: int = int(os.getenv("SCHEDULER_POLL_INTERVAL", "60"))  # seconds between checks for schedules changed by other processes, 0 = off
+    IMAGE_POOL_KIND: str = os.getenv("IMAGE_POOL_KIND", "thread")  # "thread" or "process"
+    IMAGE_POOL_WORKERS: int = int(os.getenv("IMAGE_POOL_WORKERS", "0"))  # 0 = min(4, CPU count)
+    IMAGE_POOL_MAX_QUEUE: int = int(os.getenv("IMAGE_POOL_MAX_QUEUE", "32"))  # jobs waiting beyond the workers
+    INGEST_MAX_DIMENSION: int = int(os.getenv("INGEST_MAX_DIMENSION", "2560"))  # px, longest side kept for watermarked copies
+    IMAGE_PREVIEW_DIMENSION: int = int(os.getenv("IMAGE_PREVIEW_DIMENSION", "800"))  # px, lists and carousels
+    QUERY_BUDGET: int = int(os.getenv("QUERY_BUDGET", "20"))  # DB queries per update before warning, 0 = off
+    QUERY_TIME_BUDGET_MS: float = float(os.getenv("QUERY_TIME_BUDGET_MS", "250"))  # DB time per update, 0 = off
+    QUERY_REPEAT_THRESHOLD: int = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))  # same query shape N times = N+1 hint
+    CAROUSEL_CACHE_USERS: int = int(os.getenv("CAROUSEL_CACHE_USERS", "1000"))
+    CAROUSEL_CACHE_TTL: int = int(os.getenv("CAROUSEL_CACHE_TTL", "120"))  # seconds
+    CAROUSEL_PREFETCH: int = int(os.getenv("CAROUSEL_PREFETCH", "1"))  # neighbours kept on each side
+    WEBHOOK_QUEUE: bool = os.getenv("WEBHOOK_QUEUE", "False").lower() == "true"  # ack webhooks, process on workers
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "8"))  # updates handled concurrently (one at a time per chat)
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # queued updates before answering 503
+    WEBHOOK_RUN_SCHEDULER: bool = os.getenv("WEBHOOK_RUN_SCHEDULER", "True").lower() == "true"  # one elected ASGI worker runs the scheduler
+    BOT_SESSION_POOL_SIZE: int = int(os.getenv("BOT_SESSION_POOL_SIZE", "100"))  # Bot API connections per worker
+    WEBHOOK_JSON_BACKEND: str = os.getenv("WEBHOOK_JSON_BACKEND", "pydantic")  # pydantic | orjson (if installed)
+    UPDATE_DEDUP_SIZE: int = int(os.getenv("UPDATE_DEDUP_SIZE", "10000"))  # recent update_ids remembered per process
+    UPDATE_DEDUP_SHARED: bool = os.getenv("UPDATE_DEDUP_SHARED", "False").lower() == "true"  # also claim in the processed_updates table (multi-worker)
+    UPDATE_DEDUP_TTL: int = int(os.getenv("UPDATE_DEDUP_TTL", "3600"))  # seconds a shared claim is kept
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
 
 # Initialize configurations
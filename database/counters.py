@@ -0,0 +1,233 @@
+"""
+Write-behind engagement counters
+Like/save toggles are written to their engagement rows right away; the
+product counters they drive (and product views) are applied in memory,
+served to keyboards immediately, and flushed to the database in batches by
+a background thread
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from config import app_config
+from database import identity_map
+from database.db import flip_engagement
+from telegram_bot.models import Product
+from utils.carousel_cache import carousel_cache
+from utils.logger import logger
+
+# Engagement flag -> product counter it drives
+COUNTER_FOR_FLAG = {'liked': 'likes_count', 'saved': 'saves_count'}
+# Counters shown with unflushed changes applied
+BUFFERED_COUNTERS = (*COUNTER_FOR_FLAG.values(), 'views_count')
+
+
+class CounterBuffer:
+    """
+    In-process aggregator for product counter changes.
+
+    A toggle flips the user's engagement row in the database at once (one
+    atomic upsert), so the flag itself is never buffered: a second tap
+    routed to another worker process reads and flips the stored row, and
+    toggling stays idempotent across processes. Only the resulting counter
+    deltas (and view increments) are buffered per product; a like and an
+    unlike before a flush net out to no write. A failed flush is merged
+    back and retried on the next cycle.
+
+    After each flush the buffer remembers the counters it just committed
+    and when, so counts() never goes backwards for a product snapshot
+    loaded before that flush (a delayed keyboard edit), while a snapshot
+    loaded afterwards (which may include other workers' flushes) wins.
+
+    The buffer itself lives in process memory: if the process crashes (as
+    opposed to a clean shutdown, which flushes), up to ``flush_interval``
+    seconds of counter changes are lost; the engagement rows are not.
+    """
+
+    def __init__(self, flush_interval: float, flush_events: int, max_committed: int = 10000):
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.max_committed = max_committed
+        self._lock = threading.Lock()
+        # Unflushed counter deltas per product, relative to the counters in the DB
+        self._deltas: dict[int, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._inflight_deltas: dict[int, dict[str, int]] = {}
+        self._events = 0
+        # (counters, time.monotonic() when committed) from the latest flush touching each product
+        self._committed: OrderedDict[int, tuple[dict[str, int], float]] = OrderedDict()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flush_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_interval > 0
+
+    async def toggle(self, user_id: int, product_id: int, flag: str) -> tuple[Optional[bool], Optional[Product]]:
+        """Flip a user's like/save flag; returns (new state, product), or (None, None) if the product is gone"""
+        state, product = await _flip_and_load(user_id, product_id, flag)
+        if product is None:
+            return None, None
+        self._add(product_id, COUNTER_FOR_FLAG[flag], 1 if state else -1)
+        return state, product
+
+    def add_view(self, product_id: int) -> None:
+        """Count one product view"""
+        self._add(product_id, 'views_count', 1)
+
+    def _add(self, product_id: int, counter: str, delta: int) -> None:
+        with self._lock:
+            self._deltas[product_id][counter] += delta
+            self._events += 1
+            pending = self._events
+        self._ensure_started()
+        if pending >= self.flush_events:
+            self._wake.set()
+
+    def counts(self, product: Product) -> dict:
+        """Current likes/saves/views for a product, including unflushed changes"""
+        loaded_at = getattr(product, 'loaded_at', 0.0)
+        with self._lock:
+            counts = {}
+            committed, committed_at = self._committed.get(product.id, ({}, 0.0))
+            if loaded_at >= committed_at:
+                committed = {}  # the snapshot is newer than our last flush
+            for counter in BUFFERED_COUNTERS:
+                base = committed.get(counter, getattr(product, counter))
+                delta = self._deltas.get(product.id, {}).get(counter, 0)
+                delta += self._inflight_deltas.get(product.id, {}).get(counter, 0)
+                counts[counter] = max(0, base + delta)
+            return counts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending_products': len(self._deltas),
+                'pending_events': self._events,
+                'committed_tracked': len(self._committed),
+                'flushes': self.flushes,
+                'flush_failures': self.flush_failures,
+            }
+
+    def flush_sync(self) -> int:
+        """Write pending counter deltas to the database; returns products updated"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._deltas:
+                    self._events = 0
+                    return 0
+                self._inflight_deltas = {pid: dict(d) for pid, d in self._deltas.items()}
+                self._deltas.clear()
+                self._events = 0
+                batch = self._inflight_deltas
+
+            try:
+                committed = _apply_batch(batch)
+            except Exception as e:
+                self.flush_failures += 1
+                logger.error(f"Engagement counter flush failed, will retry: {e}")
+                self._requeue()
+                return 0
+            finally:
+                close_old_connections()
+            committed_at = time.monotonic()
+
+            with self._lock:
+                self._inflight_deltas = {}
+                for product_id, counters in committed.items():
+                    self._committed[product_id] = (counters, committed_at)
+                    self._committed.move_to_end(product_id)
+                while len(self._committed) > self.max_committed:
+                    self._committed.popitem(last=False)
+            # Cached carousel snapshots predate these counters
+            carousel_cache.invalidate_products(committed)
+            self.flushes += 1
+            return len(committed)
+
+    async def flush(self) -> int:
+        """Async entry point"""
+        return await sync_to_async(self.flush_sync, thread_sensitive=False)()
+
+    def _requeue(self) -> None:
+        """Merge a failed batch back into the pending deltas"""
+        with self._lock:
+            for pid, deltas in self._inflight_deltas.items():
+                for counter, delta in deltas.items():
+                    self._deltas[pid][counter] += delta
+            self._inflight_deltas = {}
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='engagement-counter-flush', daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush_sync()
+
+    def stop(self) -> None:
+        """Stop the flusher and write whatever is still pending"""
+        self._stopped.set()
+        self._wake.set()
+        self.flush_sync()
+
+
+@sync_to_async
+def _flip_and_load(user_id: int, product_id: int, flag: str) -> tuple[Optional[bool], Optional[Product]]:
+    """Flip the stored flag (the counter is left to the buffer) and return it with the product"""
+    product = Product.objects.filter(id=product_id).first()
+    if product is None:
+        return None, None
+    try:
+        state = flip_engagement(user_id, product_id, flag)
+    except IntegrityError:
+        return None, None  # product deleted in between
+    identity_map.remember(product)
+    return state, product
+
+
+def _apply_batch(batch: dict[int, dict[str, int]]) -> dict[int, dict[str, int]]:
+    """
+    Apply counter deltas and read the results back, atomically.
+    Returns the committed counters of the updated products.
+    """
+    with transaction.atomic():
+        updated = []
+        for product_id, counters in batch.items():
+            changes = {
+                counter: Greatest(F(counter) + delta, 0)
+                for counter, delta in counters.items() if delta
+            }
+            if changes and Product.objects.filter(id=product_id).update(**changes):
+                updated.append(product_id)
+
+        return {
+            row.pop('id'): row
+            for row in Product.objects.filter(id__in=updated).values('id', *BUFFERED_COUNTERS)
+        }
+
+
+# Process-wide buffer (COUNTER_FLUSH_INTERVAL=0 disables write-behind)
+counter_buffer = CounterBuffer(
+    flush_interval=app_config.COUNTER_FLUSH_INTERVAL,
+    flush_events=app_config.COUNTER_FLUSH_EVENTS,
+)
@@ -2,11 +2,14 @@
 Database connection and operations using Django ORM
 Replaces SQLAlchemy with Django ORM
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 from asgiref.sync import sync_to_async
-from django.db import transaction
-from telegram_bot.models import User, Product, Engagement, Order, PostSchedule, ChannelPost
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from database import identity_map, search
+from telegram_bot.models import User, Product, Engagement, Order, PostSchedule, ChannelPost, MediaFile, ProcessedUpdate
 
 
 async def init_db():
@@ -15,18 +18,92 @@ async def init_db():
     pass
 
 
+# Counter columns that may be adjusted in place on products
+ENGAGEMENT_COUNTERS = frozenset({'likes_count', 'saves_count', 'orders_count', 'views_count'})
+
+
+def _engagement_upsert(flag: str) -> str:
+    """Upsert that creates or flips one engagement flag, returning its new value"""
+    other = 'saved' if flag == 'liked' else 'liked'
+    return (
+        f"INSERT INTO engagements (user_id, product_id, {flag}, {other}, created_at, updated_at) "
+        f"VALUES (%s, %s, TRUE, FALSE, %s, %s) "
+        f"ON CONFLICT (user_id, product_id) DO UPDATE "
+        f"SET {flag} = NOT engagements.{flag}, updated_at = EXCLUDED.updated_at "
+        f"RETURNING {flag}"
+    )
+
+
+def flip_engagement(user_id: int, product_id: int, flag: str) -> bool:
+    """
+    Flip an engagement flag in one statement, leaving the product counter
+    alone (database.counters buffers it). Returns the new flag state.
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(_engagement_upsert(flag), [user_id, product_id, now, now])
+        return bool(cursor.fetchone()[0])
+
+
+def _toggle_engagement(user_id: int, product_id: int, flag: str, counter: str) -> bool:
+    """
+    Flip an engagement flag and adjust the product counter without locking
+    or re-saving the product row (so ``updated_at`` is left alone).
+
+    The engagement row is upserted and flipped in one statement; on
+    PostgreSQL the counter update rides along in the same statement via a
+    data-modifying CTE. Returns the new flag state.
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    upsert = _engagement_upsert(flag)
+    bump = (
+        f"{counter} = CASE WHEN %s THEN {counter} + 1 "
+        f"WHEN {counter} > 0 THEN {counter} - 1 ELSE 0 END"
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"WITH flip AS ({upsert}) "
+                f"UPDATE products SET {bump.replace('%s', 'flip.' + flag)} "
+                f"FROM flip WHERE products.id = %s RETURNING flip.{flag}",
+                [user_id, product_id, now, now, product_id],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise Product.DoesNotExist(f"Product {product_id} does not exist")
+            return bool(row[0])
+
+        cursor.execute(upsert, [user_id, product_id, now, now])
+        state = bool(cursor.fetchone()[0])
+        cursor.execute(f"UPDATE products SET {bump} WHERE id = %s", [state, product_id])
+        return state
+
+
+@sync_to_async
+def _load_user(user_id: int) -> Optional[User]:
+    try:
+        return User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return None
+
+
+@sync_to_async
+def _load_product(product_id: int) -> Optional[Product]:
+    try:
+        return Product.objects.get(id=product_id)
+    except Product.DoesNotExist:
+        return None
+
+
 # Database helper functions using Django ORM
 class Database:
     """Database operations helper class using Django ORM"""
     
     @staticmethod
-    @sync_to_async
-    def get_user(user_id: int) -> Optional[User]:
-        """Get user by Telegram ID"""
-        try:
-            return User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return None
+    async def get_user(user_id: int) -> Optional[User]:
+        """Get user by Telegram ID (loaded once per update)"""
+        return await identity_map.get_or_load(User, user_id, _load_user)
     
     @staticmethod
     @sync_to_async
@@ -67,13 +144,9 @@ class Database:
             return None
     
     @staticmethod
-    @sync_to_async
-    def get_product(product_id: int) -> Optional[Product]:
-        """Get product by ID"""
-        try:
-            return Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            return None
+    async def get_product(product_id: int) -> Optional[Product]:
+        """Get product by ID (loaded once per update)"""
+        return await identity_map.get_or_load(Product, product_id, _load_product)
     
     @staticmethod
     @sync_to_async
@@ -84,6 +157,23 @@ class Database:
             queryset = queryset.filter(is_active=True)
         return list(queryset.order_by('-created_at'))
     
+    @staticmethod
+    @sync_to_async
+    def get_seller_product_ids(seller_id: int, active_only: bool = True) -> list[int]:
+        """IDs of a seller's products, newest first (same order as get_seller_products)"""
+        queryset = Product.objects.filter(seller_id=seller_id)
+        if active_only:
+            queryset = queryset.filter(is_active=True)
+        return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True))
+    
+    @staticmethod
+    @sync_to_async
+    def get_products_by_ids(product_ids: list[int]) -> dict[int, Product]:
+        """Fetch several products in one query, keyed by ID (missing IDs are absent)"""
+        if not product_ids:
+            return {}
+        return Product.objects.in_bulk(product_ids)
+    
     @staticmethod
     @sync_to_async
     def create_product(seller_id: int, title: str, price: float, image_path: str,
@@ -104,17 +194,41 @@ class Database:
     
     @staticmethod
     @sync_to_async
-    def search_products(query: str, limit: int = 20) -> list[Product]:
-        """Search public products by title or description"""
-        from django.db.models import Q
+    def get_recent_products(limit: int = 20,
+                            before: Optional[tuple[datetime, int]] = None) -> list[Product]:
+        """
+        Get latest public products with their sellers joined.
+        ``before`` is a (created_at, id) keyset cursor: only older products are returned.
+        """
         queryset = Product.objects.filter(
             is_public=True,
             is_active=True
-        ).filter(
-            Q(title__icontains=query) | Q(description__icontains=query)
-        ).order_by('-created_at')[:limit]
+        ).select_related('seller')
+        if before is not None:
+            created_at, product_id = before
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=product_id)
+            )
+        return list(queryset.order_by('-created_at', '-id')[:limit])
+    
+    @staticmethod
+    @sync_to_async
+    def get_saved_products(user_id: int) -> list[Product]:
+        """Get active products a user saved, most recently saved first, with sellers joined"""
+        queryset = Product.objects.filter(
+            engagements__user_id=user_id,
+            engagements__saved=True,
+            is_active=True
+        ).select_related('seller').order_by('-engagements__updated_at').distinct()
         return list(queryset)
     
+    @staticmethod
+    @sync_to_async
+    def search_products(query: str, limit: int = 20,
+                        after: Optional[tuple[float, int]] = None) -> list[Product]:
+        """Search public products by title or description, ranked by relevance"""
+        return search.search_products(query, limit=limit, after=after)
+    
     @staticmethod
     @sync_to_async
     def get_or_create_engagement(user_id: int, product_id: int) -> Engagement:
@@ -129,50 +243,19 @@ class Database:
     @sync_to_async
     def toggle_like(user_id: int, product_id: int) -> tuple[bool, Product]:
         """Toggle like on a product and update counter"""
-        with transaction.atomic():
-            engagement, _ = Engagement.objects.get_or_create(
-                user_id=user_id,
-                product_id=product_id
-            )
-            
-            # Toggle like
-            was_liked = engagement.liked
-            engagement.liked = not engagement.liked
-            engagement.save()
-            
-            # Update counter
-            product = Product.objects.select_for_update().get(id=product_id)
-            if engagement.liked:
-                product.likes_count += 1
-            else:
-                product.likes_count = max(0, product.likes_count - 1)
-            product.save()
-            
-            return engagement.liked, product
+        liked = _toggle_engagement(user_id, product_id, 'liked', 'likes_count')
+        product = Product.objects.select_related('seller').get(id=product_id)
+        identity_map.remember(product)
+        return liked, product
     
     @staticmethod
     @sync_to_async
     def toggle_save(user_id: int, product_id: int) -> tuple[bool, Product]:
         """Toggle save on a product and update counter"""
-        with transaction.atomic():
-            engagement, _ = Engagement.objects.get_or_create(
-                user_id=user_id,
-                product_id=product_id
-            )
-            
-            # Toggle save
-            engagement.saved = not engagement.saved
-            engagement.save()
-            
-            # Update counter
-            product = Product.objects.select_for_update().get(id=product_id)
-            if engagement.saved:
-                product.saves_count += 1
-            else:
-                product.saves_count = max(0, product.saves_count - 1)
-            product.save()
-            
-            return engagement.saved, product
+        saved = _toggle_engagement(user_id, product_id, 'saved', 'saves_count')
+        product = Product.objects.select_related('seller').get(id=product_id)
+        identity_map.remember(product)
+        return saved, product
     
     @staticmethod
     @sync_to_async
@@ -180,22 +263,18 @@ class Database:
                     quantity: int = 1, **kwargs) -> Order:
         """Create new order"""
         with transaction.atomic():
-            buyer = User.objects.get(id=buyer_id)
-            seller = User.objects.get(id=seller_id)
-            product = Product.objects.select_for_update().get(id=product_id)
-            
             order = Order(
-                buyer=buyer,
-                seller=seller,
-                product=product,
+                buyer_id=buyer_id,
+                seller_id=seller_id,
+                product_id=product_id,
                 quantity=quantity,
                 **kwargs
             )
             order.save()
             
-            # Update product order count
-            product.orders_count += 1
-            product.save()
+            # Update product order count in place (no row read/lock)
+            Product.objects.filter(id=product_id).update(orders_count=F('orders_count') + 1)
+            identity_map.forget(Product, product_id)
             
             return order
     
@@ -203,14 +282,14 @@ class Database:
     @sync_to_async
     def update_product_engagement(product_id: int, **kwargs) -> None:
         """Update product engagement counters"""
-        try:
-            product = Product.objects.get(id=product_id)
-            for key, value in kwargs.items():
-                if hasattr(product, key):
-                    setattr(product, key, getattr(product, key) + value)
-            product.save()
-        except Product.DoesNotExist:
-            pass
+        deltas = {
+            key: F(key) + value
+            for key, value in kwargs.items()
+            if key in ENGAGEMENT_COUNTERS
+        }
+        if deltas:
+            Product.objects.filter(id=product_id).update(**deltas)
+            identity_map.forget(Product, product_id)
 
     @staticmethod
     @sync_to_async
@@ -256,8 +335,103 @@ class Database:
     @staticmethod
     @sync_to_async
     def get_active_schedules() -> list[PostSchedule]:
-        """Get all active schedules"""
-        return list(PostSchedule.objects.filter(is_active=True).order_by('next_post_at'))
+        """Get all active schedules with product and seller joined"""
+        queryset = PostSchedule.objects.filter(
+            is_active=True
+        ).select_related('product', 'seller').order_by('next_post_at')
+        return list(queryset)
+    
+    @staticmethod
+    @sync_to_async
+    def get_schedule_due_times(schedule_ids: Optional[list[int]] = None) -> list[tuple[int, Optional[datetime]]]:
+        """(id, next_post_at) for active schedules, optionally limited to ``schedule_ids``"""
+        queryset = PostSchedule.objects.filter(is_active=True, next_post_at__isnull=False)
+        if schedule_ids is not None:
+            queryset = queryset.filter(id__in=schedule_ids)
+        return list(queryset.values_list('id', 'next_post_at'))
+    
+    @staticmethod
+    @sync_to_async
+    def get_schedule_due_changes(since: datetime) -> list[tuple[int, Optional[datetime]]]:
+        """(id, next_post_at) for schedules updated since ``since``; None when inactive"""
+        rows = PostSchedule.objects.filter(updated_at__gte=since).values_list('id', 'is_active', 'next_post_at')
+        return [(schedule_id, next_post_at if is_active else None) for schedule_id, is_active, next_post_at in rows]
+    
+    @staticmethod
+    @sync_to_async
+    def claim_due_schedules(now: datetime, token: str, lease_seconds: int,
+                            limit: int = 500, exclude_ids=None) -> list[PostSchedule]:
+        """
+        Lease due schedules to one worker run.
+        Rows locked by another worker are skipped (SKIP LOCKED where supported)
+        and the claim itself only succeeds on unclaimed or expired rows, so
+        concurrent workers never get the same schedule. Returns the claimed
+        schedules with product and seller joined; ``exclude_ids`` skips
+        schedules this run already attempted.
+        """
+        unclaimed = Q(claim_expires_at__isnull=True) | Q(claim_expires_at__lt=now)
+        with transaction.atomic():
+            candidate_ids = list(
+                PostSchedule.objects.select_for_update(skip_locked=True).filter(
+                    unclaimed,
+                    is_active=True,
+                    next_post_at__lte=now
+                ).exclude(
+                    id__in=exclude_ids or ()
+                ).order_by('next_post_at').values_list('id', flat=True)[:limit]
+            )
+            if not candidate_ids:
+                return []
+            PostSchedule.objects.filter(unclaimed, id__in=candidate_ids).update(
+                claimed_by=token,
+                claim_expires_at=now + timedelta(seconds=lease_seconds)
+            )
+        queryset = PostSchedule.objects.filter(
+            claimed_by=token
+        ).select_related('product', 'seller').order_by('next_post_at')
+        return list(queryset)
+    
+    @staticmethod
+    @sync_to_async
+    def complete_schedule_claim(schedule_id: int, token: str, last_posted: datetime,
+                                next_post: datetime) -> bool:
+        """Advance a claimed schedule and release its lease; False if the lease was lost"""
+        updated = PostSchedule.objects.filter(id=schedule_id, claimed_by=token).update(
+            last_posted_at=last_posted,
+            next_post_at=next_post,
+            claimed_by=None,
+            claim_expires_at=None,
+            updated_at=timezone.now()
+        )
+        return bool(updated)
+    
+    @staticmethod
+    @sync_to_async
+    def extend_schedule_claim(schedule_id: int, token: str, lease_seconds: int) -> bool:
+        """Renew a lease just before posting; False if another worker has taken it over"""
+        updated = PostSchedule.objects.filter(id=schedule_id, claimed_by=token).update(
+            claim_expires_at=timezone.now() + timedelta(seconds=lease_seconds)
+        )
+        return bool(updated)
+    
+    @staticmethod
+    @sync_to_async
+    def release_schedule_claim(schedule_id: int, token: str) -> None:
+        """Give a claimed schedule back without posting it"""
+        PostSchedule.objects.filter(id=schedule_id, claimed_by=token).update(
+            claimed_by=None,
+            claim_expires_at=None
+        )
+    
+    @staticmethod
+    @sync_to_async
+    def get_seller_schedules(seller_id: int) -> list[PostSchedule]:
+        """Get a seller's active schedules with products joined"""
+        queryset = PostSchedule.objects.filter(
+            seller_id=seller_id,
+            is_active=True
+        ).select_related('product').order_by('next_post_at')
+        return list(queryset)
     
     @staticmethod
     @sync_to_async
@@ -279,5 +453,59 @@ class Database:
         except PostSchedule.DoesNotExist:
             return None
 
+    @staticmethod
+    @sync_to_async
+    def get_media_file_ids(keys: list[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        """Look up cached Telegram file_ids for (path, content_hash) pairs"""
+        if not keys:
+            return {}
+        paths = {path for path, _ in keys}
+        hashes = {content_hash for _, content_hash in keys}
+        rows = MediaFile.objects.filter(path__in=paths, content_hash__in=hashes)
+        wanted = set(keys)
+        return {
+            (row.path, row.content_hash): row.file_id
+            for row in rows
+            if (row.path, row.content_hash) in wanted
+        }
+    
+    @staticmethod
+    @sync_to_async
+    def save_media_file_id(path: str, content_hash: str, file_id: str,
+                           file_unique_id: str = None) -> None:
+        """Remember the file_id Telegram assigned to an uploaded image"""
+        MediaFile.objects.update_or_create(
+            path=path,
+            content_hash=content_hash,
+            defaults={'file_id': file_id, 'file_unique_id': file_unique_id}
+        )
+    
+    @staticmethod
+    @sync_to_async
+    def forget_media_file_ids(file_ids: list[str]) -> None:
+        """Drop file_ids Telegram no longer accepts"""
+        MediaFile.objects.filter(file_id__in=file_ids).delete()
+    
+    @staticmethod
+    @sync_to_async
+    def claim_update(update_id: int) -> bool:
+        """Record an update_id; False if another worker already claimed it"""
+        _, created = ProcessedUpdate.objects.get_or_create(update_id=update_id)
+        return created
+    
+    @staticmethod
+    @sync_to_async
+    def release_update(update_id: int) -> None:
+        """Forget a claim so a redelivery of the update is handled again"""
+        ProcessedUpdate.objects.filter(update_id=update_id).delete()
+    
+    @staticmethod
+    @sync_to_async
+    def prune_processed_updates(max_age_seconds: int) -> int:
+        """Delete claims older than max_age_seconds; returns rows deleted"""
+        cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+        deleted, _ = ProcessedUpdate.objects.filter(created_at__lt=cutoff).delete()
+        return deleted
+
 # Export database instance
 db = Database()
@@ -0,0 +1,99 @@
+"""
+Per-update identity map
+Each User/Product row is materialized at most once while one Telegram
+update is handled; writes made during the update evict the entry
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+
+class IdentityMap:
+    """(model, pk) -> instance (or None for rows known not to exist)"""
+
+    def __init__(self):
+        self._entries: dict[tuple[type, Any], Any] = {}
+        self.hits = 0
+        self.loads = 0
+
+    async def get_or_load(self, model: type, pk, load: Callable[[Any], Awaitable[Any]]):
+        key = (model, pk)
+        if key in self._entries:
+            self.hits += 1
+            return self._entries[key]
+        self.loads += 1
+        instance = await load(pk)
+        self._entries[key] = instance
+        return instance
+
+    def put(self, instance) -> None:
+        self._entries[(type(instance), instance.pk)] = instance
+
+    def forget(self, model: type, pk) -> None:
+        self._entries.pop((model, pk), None)
+
+
+# Set for the duration of one update; sync_to_async copies the context into
+# its worker thread, so signal handlers there see (and evict from) the same map
+_current: ContextVar[Optional[IdentityMap]] = ContextVar('identity_map', default=None)
+
+
+def current() -> Optional[IdentityMap]:
+    return _current.get()
+
+
+async def get_or_load(model: type, pk, load: Callable[[Any], Awaitable[Any]]):
+    """Load through the current update's map, or directly outside an update"""
+    identity_map = _current.get()
+    if identity_map is None:
+        return await load(pk)
+    return await identity_map.get_or_load(model, pk, load)
+
+
+def remember(instance) -> None:
+    """Record a freshly loaded or written instance in the current map"""
+    identity_map = _current.get()
+    if identity_map is not None and instance is not None:
+        identity_map.put(instance)
+
+
+def forget(model: type, pk) -> None:
+    """Evict an entry after a write (no-op outside an update)"""
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.forget(model, pk)
+
+
+@contextmanager
+def identity_scope():
+    """Open a fresh map for a unit of work outside the dispatcher"""
+    token = _current.set(IdentityMap())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+class IdentityMapMiddleware(BaseMiddleware):
+    """Outer update middleware: one identity map per update"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        with identity_scope():
+            return await handler(event, data)
+
+
+_middleware = IdentityMapMiddleware()
+
+
+def install_identity_map(dp: Dispatcher) -> None:
+    """Attach the identity map middleware to a dispatcher (idempotent)"""
+    if _middleware not in dp.update.outer_middleware:
+        dp.update.outer_middleware(_middleware)
@@ -0,0 +1,244 @@
+"""
+Product full-text search
+PostgreSQL tsvector + GIN index with trigram similarity for typos, and a
+pure-Python inverted index fallback used when running on SQLite (tests)
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q
+
+from telegram_bot.models import Product
+
+# 'simple' config: no stemming/stop words, works for mixed Amharic/English titles
+SEARCH_CONFIG = 'simple'
+# Fields that feed the search document; saves touching other fields skip reindexing
+SEARCH_FIELDS = frozenset({'title', 'description'})
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+def uses_postgres() -> bool:
+    """Whether the active database supports tsvector/trigram search"""
+    return connection.vendor == 'postgresql'
+
+
+def product_search_vector() -> SearchVector:
+    """Weighted search document: title ranks above description"""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def _prefix_tsquery(query: str) -> Optional[SearchQuery]:
+    """Build a prefix tsquery ("iph:* & pro:*") so partial inline input matches"""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    raw = ' & '.join(f"{token}:*" for token in tokens)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over product title/description.
+    Used instead of tsvector when the database is not PostgreSQL.
+    Supports exact, prefix and trigram (typo-tolerant) token matches.
+    """
+
+    TITLE_WEIGHT = 1.0
+    DESCRIPTION_WEIGHT = 0.4
+    PREFIX_FACTOR = 0.8
+    FUZZY_FACTOR = 0.6
+    FUZZY_THRESHOLD = 0.45
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._documents: dict[int, set[str]] = {}
+        self._loaded = False
+
+    def index(self, product_id: int, title: Optional[str], description: Optional[str]) -> None:
+        """Add or replace a product document"""
+        weights: dict[str, float] = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += self.TITLE_WEIGHT
+        for token in tokenize(description):
+            weights[token] += self.DESCRIPTION_WEIGHT
+
+        with self._lock:
+            self._remove_locked(product_id)
+            for token, weight in weights.items():
+                self._postings[token][product_id] = weight
+            self._documents[product_id] = set(weights)
+
+    def remove(self, product_id: int) -> None:
+        """Drop a product document"""
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def _remove_locked(self, product_id: int) -> None:
+        for token in self._documents.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+
+    def ensure_loaded(self) -> None:
+        """Build the index from the database on first use"""
+        if self._loaded:
+            return
+        rows = Product.objects.values_list('id', 'title', 'description')
+        for product_id, title, description in rows.iterator():
+            self.index(product_id, title, description)
+        self._loaded = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._loaded = False
+
+    def search(self, query: str) -> list[tuple[int, float]]:
+        """
+        Rank products matching every query token.
+
+        Returns:
+            List of (product_id, score) sorted by score, best first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            total_docs = max(len(self._documents), 1)
+            scores: Optional[dict[int, float]] = None
+
+            for token in tokens:
+                token_scores = self._match_token_locked(token, total_docs)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        pid: score + token_scores[pid]
+                        for pid, score in scores.items()
+                        if pid in token_scores
+                    }
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+    def _match_token_locked(self, token: str, total_docs: int) -> dict[int, float]:
+        """Score documents for one query token (exact > prefix > fuzzy)"""
+        matches: list[tuple[str, float]] = []
+        if token in self._postings:
+            matches.append((token, 1.0))
+        for term in self._postings:
+            if term != token and term.startswith(token):
+                matches.append((term, self.PREFIX_FACTOR))
+        if not matches:
+            token_grams = _trigrams(token)
+            for term in self._postings:
+                similarity = _jaccard(token_grams, _trigrams(term))
+                if similarity >= self.FUZZY_THRESHOLD:
+                    matches.append((term, self.FUZZY_FACTOR * similarity))
+
+        scores: dict[int, float] = {}
+        for term, factor in matches:
+            postings = self._postings[term]
+            idf = math.log(1 + total_docs / len(postings))
+            for pid, weight in postings.items():
+                score = weight * factor * idf
+                if score > scores.get(pid, 0.0):
+                    scores[pid] = score
+        return scores
+
+
+def _trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _jaccard(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# Process-wide fallback index (only populated on non-PostgreSQL databases)
+fallback_index = InvertedIndex()
+
+
+def refresh_product(product: Product) -> None:
+    """Recompute the search document for a saved product"""
+    if uses_postgres():
+        Product.objects.filter(pk=product.pk).update(search_vector=product_search_vector())
+    elif fallback_index._loaded:
+        fallback_index.index(product.pk, product.title, product.description)
+
+
+def forget_product(product_id: int) -> None:
+    """Remove a deleted product from the fallback index"""
+    if not uses_postgres():
+        fallback_index.remove(product_id)
+
+
+def search_products(query: str, limit: int = 20,
+                    after: Optional[tuple[float, int]] = None) -> list[Product]:
+    """
+    Search public, active products ranked by relevance.
+    Each returned product carries a ``search_rank`` attribute and has its
+    seller joined in the same query. ``after`` is a (search_rank, id) keyset
+    cursor taken from the last product of the previous page.
+    """
+    base = Product.objects.filter(is_public=True, is_active=True).select_related('seller')
+
+    if uses_postgres():
+        ts_query = _prefix_tsquery(query)
+        if ts_query is None:
+            return []
+        queryset = base.annotate(
+            similarity=TrigramSimilarity('title', query),
+            search_rank=SearchRank(F('search_vector'), ts_query) + F('similarity'),
+        ).filter(
+            Q(search_vector=ts_query) | Q(title__trigram_similar=query)
+        )
+        if after is not None:
+            rank, product_id = after
+            queryset = queryset.filter(
+                Q(search_rank__lt=rank) | Q(search_rank=rank, id__lt=product_id)
+            )
+        return list(queryset.order_by('-search_rank', '-id')[:limit])
+
+    fallback_index.ensure_loaded()
+    ranked = fallback_index.search(query)
+    if after is not None:
+        rank, product_id = after
+        ranked = [
+            (pid, score) for pid, score in ranked
+            if score < rank or (score == rank and pid < product_id)
+        ]
+    if not ranked:
+        return []
+    scores = dict(ranked)
+    products = list(base.filter(id__in=scores))
+    for product in products:
+        product.search_rank = scores[product.id]
+    products.sort(key=lambda p: (-p.search_rank, -p.id))
+    return products[:limit]
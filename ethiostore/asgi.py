@@ -1,10 +1,23 @@
 """
 ASGI config for ethiostore project.
+
+Serve with uvicorn (one long-lived event loop per worker):
+    WEB_CONCURRENCY=4 uvicorn ethiostore.asgi:application --lifespan on
 """
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ethiostore.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from telegram_bot.lifespan import lifespan  # noqa: E402
+
 
+async def application(scope, receive, send):
+    """Django for HTTP; bot startup/shutdown on lifespan events"""
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,42 @@
+"""
+Admin feature
+Operator-only commands (ADMIN_IDS)
+"""
+import json
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from config import bot_config
+from utils.logger import logger
+from utils.runtime_stats import collect
+
+router = Router()
+
+# Telegram's message limit, less room for the code fence
+MAX_CHUNK = 4000
+
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message):
+    """Show this process's cache, limiter and queue statistics"""
+    if message.from_user.id not in bot_config.ADMIN_IDS:
+        return  # not advertised; stay silent for everyone else
+
+    try:
+        text = json.dumps(collect(), indent=1, default=str)
+    except Exception as e:
+        logger.error(f"Error collecting runtime stats: {e}")
+        await message.answer("❌ Error collecting stats")
+        return
+
+    # Split on line boundaries so each chunk stays a valid code block
+    chunk = ""
+    for line in text.splitlines(keepends=True):
+        if len(chunk) + len(line) > MAX_CHUNK:
+            await message.answer(f"```\n{chunk}```")
+            chunk = ""
+        chunk += line
+    if chunk:
+        await message.answer(f"```\n{chunk}```")
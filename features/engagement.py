@@ -8,8 +8,13 @@ from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
+from database.counters import counter_buffer
 from database.db import db
 from utils.helpers import format_price, create_product_keyboard, format_product_caption
+from utils.edit_coalescer import keyboard_edits
+from utils.ingest import PREVIEW
+from utils.inline_cache import inline_cache
+from utils import media_registry
 from utils.logger import logger
 
 router = Router()
@@ -21,6 +26,30 @@ class OrderStates(StatesGroup):
     waiting_location = State()  # Keep for compatibility but not used
     confirming = State()        # Keep for compatibility but not used
 
+def _keyboard_builder(product, seller):
+    """
+    Build the product keyboard lazily so a delayed edit shows the latest counts
+    (the buffer tracks committed counters, so a flush in between is safe)
+    """
+    custom_button = None
+    if product.custom_button_text and product.custom_button_url:
+        custom_button = (product.custom_button_text, product.custom_button_url)
+    
+    def build():
+        counts = counter_buffer.counts(product)
+        return create_product_keyboard(
+            product_id=product.id,
+            seller_phone=seller.phone,
+            custom_button=custom_button,
+            likes_count=counts['likes_count'],
+            saves_count=counts['saves_count'],
+            like_enabled=product.like_enabled,
+            save_enabled=product.save_enabled,
+            order_enabled=product.order_enabled
+        )
+    
+    return build
+
 @router.callback_query(F.data.startswith("like_"))
 async def handle_like(callback: CallbackQuery):
     """Handle product like button"""
@@ -28,33 +57,22 @@ async def handle_like(callback: CallbackQuery):
         product_id = int(callback.data.split('_')[1])
         user_id = callback.from_user.id
         
-        # Toggle like
-        is_liked, product = await db.toggle_like(user_id, product_id)
+        # Toggle like (buffered and flushed in batches unless write-behind is disabled)
+        if counter_buffer.enabled:
+            is_liked, product = await counter_buffer.toggle(user_id, product_id, 'liked')
+            if product is None:
+                await callback.answer("❌ This product is no longer available", show_alert=True)
+                return
+        else:
+            is_liked, product = await db.toggle_like(user_id, product_id)
+        # Cached inline results show the old counters
+        inline_cache.invalidate_product(product_id)
         
         # Get seller info
         seller = await db.get_user(product.seller_id)
         
-        # Update keyboard to reflect new state
-        custom_button = None
-        if product.custom_button_text and product.custom_button_url:
-            custom_button = (product.custom_button_text, product.custom_button_url)
-        
-        keyboard = create_product_keyboard(
-            product_id=product.id,
-            seller_phone=seller.phone,
-            custom_button=custom_button,
-            likes_count=product.likes_count,
-            saves_count=product.saves_count,
-            like_enabled=product.like_enabled,
-            save_enabled=product.save_enabled,
-            order_enabled=product.order_enabled
-        )
-        
-        # Update message
-        try:
-            await callback.message.edit_reply_markup(reply_markup=keyboard)
-        except:
-            pass  # Message might be too old to edit
+        # Update keyboard to reflect new state (bursts on one message are coalesced into one edit)
+        await keyboard_edits.submit(callback, _keyboard_builder(product, seller))
         
         # Show feedback
         if is_liked:
@@ -75,33 +93,22 @@ async def handle_save(callback: CallbackQuery):
         product_id = int(callback.data.split('_')[1])
         user_id = callback.from_user.id
         
-        # Toggle save
-        is_saved, product = await db.toggle_save(user_id, product_id)
+        # Toggle save (buffered and flushed in batches unless write-behind is disabled)
+        if counter_buffer.enabled:
+            is_saved, product = await counter_buffer.toggle(user_id, product_id, 'saved')
+            if product is None:
+                await callback.answer("❌ This product is no longer available", show_alert=True)
+                return
+        else:
+            is_saved, product = await db.toggle_save(user_id, product_id)
+        # Cached inline results show the old counters
+        inline_cache.invalidate_product(product_id)
         
         # Get seller info
         seller = await db.get_user(product.seller_id)
         
-        # Update keyboard
-        custom_button = None
-        if product.custom_button_text and product.custom_button_url:
-            custom_button = (product.custom_button_text, product.custom_button_url)
-        
-        keyboard = create_product_keyboard(
-            product_id=product.id,
-            seller_phone=seller.phone,
-            custom_button=custom_button,
-            likes_count=product.likes_count,
-            saves_count=product.saves_count,
-            like_enabled=product.like_enabled,
-            save_enabled=product.save_enabled,
-            order_enabled=product.order_enabled
-        )
-        
-        # Update message
-        try:
-            await callback.message.edit_reply_markup(reply_markup=keyboard)
-        except:
-            pass
+        # Update keyboard (bursts on one message are coalesced into one edit)
+        await keyboard_edits.submit(callback, _keyboard_builder(product, seller))
         
         # Show feedback
         if is_saved:
@@ -212,9 +219,6 @@ async def handle_order_start(callback: CallbackQuery):
         except Exception as e:
             logger.error(f"Failed to notify seller {seller.id} about order: {e}")
         
-        # Update product engagement stats
-        await db.update_product_engagement(product_id, orders_count=1)
-        
         logger.info(f"Order {order.id} created: User {user_id} ordered product {product_id} from seller {seller.id}")
         
     except Exception as e:
@@ -400,14 +404,8 @@ async def cmd_saved_products(message: Message):
     """Show user's saved products"""
     user_id = message.from_user.id
     
-    # Get saved products using Django ORM
-    from telegram_bot.models import Product, Engagement
-    
-    saved_products = list(Product.objects.filter(
-        engagements__user_id=user_id,
-        engagements__saved=True,
-        is_active=True
-    ).order_by('-engagements__updated_at').distinct())
+    # Get saved products (sellers joined in the same query)
+    saved_products = await db.get_saved_products(user_id)
     
     if not saved_products:
         await message.answer(
@@ -423,7 +421,8 @@ async def cmd_saved_products(message: Message):
     
     # Send each saved product
     for product in saved_products[:10]:  # Limit to 10
-        seller = await db.get_user(product.seller_id)
+        seller = product.seller
+        counts = counter_buffer.counts(product)
         
         caption = format_product_caption(
             title=product.title,
@@ -440,18 +439,16 @@ async def cmd_saved_products(message: Message):
             product_id=product.id,
             seller_phone=seller.phone,
             custom_button=custom_button,
-            likes_count=product.likes_count,
-            saves_count=product.saves_count,
+            likes_count=counts['likes_count'],
+            saves_count=counts['saves_count'],
             like_enabled=product.like_enabled,
             save_enabled=product.save_enabled,
             order_enabled=product.order_enabled
         )
         
         try:
-            from aiogram.types import FSInputFile
-            photo = FSInputFile(product.image_path)
-            await message.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                message.bot, message.chat.id, product.image_for(PREVIEW),
                 caption=caption,
                 reply_markup=keyboard
             )
@@ -464,12 +461,7 @@ async def cmd_saved_products(message: Message):
 @router.message(Command("browse"))
 async def cmd_browse_products(message: Message):
     """Browse latest products"""
-    from telegram_bot.models import Product
-    
-    products = list(Product.objects.filter(
-        is_public=True,
-        is_active=True
-    ).order_by('-created_at')[:10])
+    products = await db.get_recent_products(limit=10)
     
     if not products:
         await message.answer("📦 No products available yet.")
@@ -478,7 +470,8 @@ async def cmd_browse_products(message: Message):
     await message.answer("🛍️ **Latest Products:**\n\nBrowsing top 10 products...")
     
     for product in products:
-        seller = await db.get_user(product.seller_id)
+        seller = product.seller
+        counts = counter_buffer.counts(product)
         
         caption = format_product_caption(
             title=product.title,
@@ -486,8 +479,7 @@ async def cmd_browse_products(message: Message):
             price=product.price,
             category=product.category,
             engagement_stats={
-                'likes_count': product.likes_count,
-                'saves_count': product.saves_count,
+                **counts,
                 'orders_count': product.orders_count
             }
         )
@@ -500,18 +492,16 @@ async def cmd_browse_products(message: Message):
             product_id=product.id,
             seller_phone=seller.phone,
             custom_button=custom_button,
-            likes_count=product.likes_count,
-            saves_count=product.saves_count,
+            likes_count=counts['likes_count'],
+            saves_count=counts['saves_count'],
             like_enabled=product.like_enabled,
             save_enabled=product.save_enabled,
             order_enabled=product.order_enabled
         )
         
         try:
-            from aiogram.types import FSInputFile
-            photo = FSInputFile(product.image_path)
-            await message.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                message.bot, message.chat.id, product.image_for(PREVIEW),
                 caption=caption,
                 reply_markup=keyboard
             )
@@ -2,16 +2,56 @@
 Inline search feature
 Allows users to search and share products using inline mode
 """
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
 from aiogram import Router
 from aiogram.types import InlineQuery, InlineQueryResultPhoto, InlineQueryResultArticle, InputTextMessageContent
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from database.counters import counter_buffer
 from database.db import db
 from utils.helpers import format_price, create_product_keyboard, truncate_text, escape_markdown
+from utils.inline_cache import inline_cache, normalize_query
 from utils.logger import logger
+from config import app_config
 
 router = Router()
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _encode_cursor(product, ranked: bool) -> str:
+    """
+    Build next_offset from the last product on a page.
+    Feed pages use a (created_at, id) cursor, search pages (search_rank, id);
+    both stay stable when newer products are added.
+    """
+    if ranked:
+        raw = f"r:{product.search_rank!r}:{product.id}"
+    else:
+        micros = (product.created_at - _EPOCH) // timedelta(microseconds=1)
+        raw = f"t:{micros}:{product.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(offset: str) -> Optional[tuple[str, object, int]]:
+    """Parse next_offset back into (kind, key, id); None for the first page or junk"""
+    if not offset:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(offset + "=" * (-len(offset) % 4)).decode()
+        kind, key, product_id = raw.split(":")
+        if kind == "t":
+            return kind, _EPOCH + timedelta(microseconds=int(key)), int(product_id)
+        if kind == "r":
+            return kind, float(key), int(product_id)
+    except (ValueError, UnicodeDecodeError):
+        pass
+    return None
+
+
 @router.inline_query()
 async def inline_search(inline_query: InlineQuery):
     """
@@ -24,20 +64,45 @@ async def inline_search(inline_query: InlineQuery):
     # Log inline query
     logger.info(f"Inline query from {user_id}: '{query}'")
     
+    # Short queries all map to the recent-products feed
+    cache_key = normalize_query(query) if len(query) >= 2 else ""
+    offset = inline_query.offset or ""
+    
+    cached = inline_cache.get(cache_key, offset)
+    if cached is not None:
+        await _answer(inline_query, cached.results, cached.next_offset, first_page=not offset)
+        logger.info(f"Inline query answered from cache with {len(cached.results)} results")
+        return
+    
+    # Keyset pagination: a small first page, later pages load lazily as the
+    # user scrolls. One extra row tells us whether another page exists.
+    page_size = app_config.INLINE_PAGE_SIZE
+    cursor = _decode_cursor(offset)
+    
     # If query is empty, show popular/recent products
-    if not query or len(query) < 2:
-        # Get recent products (limit 20) using Django ORM
-        from telegram_bot.models import Product
-        
-        products = list(Product.objects.filter(
-            is_public=True,
-            is_active=True
-        ).order_by('-created_at')[:20])
+    # Sellers are joined into the product query, so building results below
+    # costs no further round trips
+    if not cache_key:
+        before = cursor[1:] if cursor and cursor[0] == "t" else None
+        products = await db.get_recent_products(limit=page_size + 1, before=before)
     else:
-        # Search products
-        products = await db.search_products(query, limit=50)
+        after = cursor[1:] if cursor and cursor[0] == "r" else None
+        products = await db.search_products(query, limit=page_size + 1, after=after)
+    
+    next_offset = ""
+    if len(products) > page_size:
+        products = products[:page_size]
+        next_offset = _encode_cursor(products[-1], ranked=bool(cache_key))
+    
+    results = [_build_result(product) for product in products]
+    inline_cache.set(cache_key, offset, results, (product.id for product in products), next_offset)
     
-    if not products:
+    await _answer(inline_query, results, next_offset, first_page=not offset)
+    logger.info(f"Inline query answered with {len(results)} results")
+
+async def _answer(inline_query: InlineQuery, results: list, next_offset: str = "", first_page: bool = True):
+    """Send results (or the no-results hint) back to Telegram"""
+    if not results and first_page:
         # No results found
         await inline_query.answer(
             results=[],
@@ -47,74 +112,71 @@ async def inline_search(inline_query: InlineQuery):
         )
         return
     
-    # Build results
-    results = []
-    
-    for product in products:
-        # Get seller info
-        seller = await db.get_user(product.seller_id)
-        
-        # Create caption
-        caption = (
-            f"🛍️ **{product.title}**\n\n"
-            f"{truncate_text(product.description or '', 150)}\n\n"
-            f"💰 **Price:** {format_price(product.price)}\n"
-            f"🏪 **Seller:** {seller.store_name}\n"
-        )
-        
-        if product.category:
-            caption += f"📁 **Category:** {product.category}\n"
-        
-        # Add engagement stats if any
-        if product.likes_count > 0 or product.saves_count > 0:
-            stats = []
-            if product.likes_count > 0:
-                stats.append(f"❤️ {product.likes_count}")
-            if product.saves_count > 0:
-                stats.append(f"💾 {product.saves_count}")
-            if product.orders_count > 0:
-                stats.append(f"🛒 {product.orders_count}")
-            
-            caption += f"\n📊 {' • '.join(stats)}"
-        
-        # Create inline keyboard
-        custom_button = None
-        if product.custom_button_text and product.custom_button_url:
-            custom_button = (product.custom_button_text, product.custom_button_url)
-        
-        keyboard = create_product_keyboard(
-            product_id=product.id,
-            seller_phone=seller.phone,
-            custom_button=custom_button,
-            likes_count=product.likes_count,
-            saves_count=product.saves_count,
-            like_enabled=product.like_enabled,
-            save_enabled=product.save_enabled,
-            order_enabled=product.order_enabled
-        )
-        
-        # Create result - using text result since we can't use file:// URLs for inline queries
-        result = InlineQueryResultArticle(
-            id=str(product.id),
-            title=f"🛍️ {product.title}",
-            description=f"{format_price(product.price)} - {seller.store_name}",
-            input_message_content=InputTextMessageContent(
-                message_text=f"🛍️ **{escape_markdown(product.title)}**\n\n{escape_markdown(product.description)}\n\n💰 **Price:** {escape_markdown(format_price(product.price))}\n\n🏪 **Seller:** {escape_markdown(seller.store_name)}\n\nUse /view\\_{product.id} to see full product details with image\\.",
-                parse_mode="MarkdownV2"
-            ),
-            reply_markup=keyboard
-        )
-        
-        results.append(result)
-    
     # Answer inline query
     await inline_query.answer(
         results=results,
         cache_time=30,  # Cache for 30 seconds
-        is_personal=False  # Results are the same for everyone
+        is_personal=False,  # Results are the same for everyone
+        next_offset=next_offset  # Empty string tells Telegram there are no more pages
     )
+
+def _build_result(product) -> InlineQueryResultArticle:
+    """Build the shareable article (caption, keyboard) for one product"""
+    seller = product.seller
     
-    logger.info(f"Inline query answered with {len(results)} results")
+    # Create caption
+    caption = (
+        f"🛍️ **{product.title}**\n\n"
+        f"{truncate_text(product.description or '', 150)}\n\n"
+        f"💰 **Price:** {format_price(product.price)}\n"
+        f"🏪 **Seller:** {seller.store_name}\n"
+    )
+    
+    if product.category:
+        caption += f"📁 **Category:** {product.category}\n"
+    
+    # Add engagement stats if any (including clicks not yet flushed)
+    counts = counter_buffer.counts(product)
+    if counts['likes_count'] > 0 or counts['saves_count'] > 0:
+        stats = []
+        if counts['likes_count'] > 0:
+            stats.append(f"❤️ {counts['likes_count']}")
+        if counts['saves_count'] > 0:
+            stats.append(f"💾 {counts['saves_count']}")
+        if product.orders_count > 0:
+            stats.append(f"🛒 {product.orders_count}")
+        
+        caption += f"\n📊 {' • '.join(stats)}"
+    
+    # Create inline keyboard
+    custom_button = None
+    if product.custom_button_text and product.custom_button_url:
+        custom_button = (product.custom_button_text, product.custom_button_url)
+    
+    keyboard = create_product_keyboard(
+        product_id=product.id,
+        seller_phone=seller.phone,
+        custom_button=custom_button,
+        likes_count=counts['likes_count'],
+        saves_count=counts['saves_count'],
+        like_enabled=product.like_enabled,
+        save_enabled=product.save_enabled,
+        order_enabled=product.order_enabled
+    )
+    
+    # Create result - using text result since we can't use file:// URLs for inline queries
+    result = InlineQueryResultArticle(
+        id=str(product.id),
+        title=f"🛍️ {product.title}",
+        description=f"{format_price(product.price)} - {seller.store_name}",
+        input_message_content=InputTextMessageContent(
+            message_text=f"🛍️ **{escape_markdown(product.title)}**\n\n{escape_markdown(product.description)}\n\n💰 **Price:** {escape_markdown(format_price(product.price))}\n\n🏪 **Seller:** {escape_markdown(seller.store_name)}\n\nUse /view\\_{product.id} to see full product details with image\\.",
+            parse_mode="MarkdownV2"
+        ),
+        reply_markup=keyboard
+    )
+    
+    return result
 
 # Note: For production, you'll need to serve images via a web server
 # and use actual HTTP URLs instead of file:// URLs
@@ -8,18 +8,23 @@ import asyncio
 import aiogram
 from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
-from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from asgiref.sync import sync_to_async
 
+from database.counters import counter_buffer
 from database.db import db
 from telegram_bot.models import Product
-from utils.watermark import add_watermark
+from utils.ingest import FULL, PREVIEW, ingest_photo
+from utils.media_store import product_media_paths, release_legacy
+from utils.carousel_cache import carousel_cache
 from utils.helpers import (format_price, create_product_keyboard, format_product_caption, 
                           escape_markdown, create_product_carousel_keyboard, create_cancel_keyboard)
+from utils import media_registry
 from utils.logger import logger
+from utils.outbound import BULK, outbound_priority
 from config import app_config, bot_config
 
 router = Router()
@@ -30,6 +35,10 @@ album_buffer = {}
 # Track which album ids already have a scheduled processing task so we
 # don't schedule multiple prompts for the same media_group_id.
 album_tasks_scheduled: set[str] = set()
+# When the latest part of each album arrived (time.monotonic())
+album_last_part: dict[str, float] = {}
+# Quiet period after the latest part before an album is considered complete
+ALBUM_SETTLE_SECONDS = 0.4
 
 @router.callback_query(F.data == "cancel_fsm")
 async def handle_cancel_fsm(callback: CallbackQuery, state: FSMContext):
@@ -117,21 +126,43 @@ def create_edit_buttons_keyboard(product) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-async def show_my_product_carousel(message_or_callback, user_id: int, products: list, index: int, edit_mode: bool = False):
+async def _carousel_products(user_id: int, product_ids: list, index: int, neighbours: bool = True) -> dict:
+    """
+    Product at ``index`` in a seller's carousel (plus its neighbours), keyed by ID
+    
+    Served from the per-user carousel cache; only missing IDs are fetched,
+    in a single query. Deleted products are simply absent.
+    """
+    window = carousel_cache.window(product_ids, index)
+    wanted = window if neighbours else [product_ids[index]]
+    products = carousel_cache.get_many(user_id, wanted)
+    missing = [product_id for product_id in wanted if product_id not in products]
+    fetched = await db.get_products_by_ids(missing) if missing else {}
+    carousel_cache.put_many(user_id, fetched.values(), keep=window)
+    products.update(fetched)
+    return products
+
+async def _record_view(product_id: int):
+    """Count a buyer's view of a product (buffered unless write-behind is disabled)"""
+    if counter_buffer.enabled:
+        counter_buffer.add_view(product_id)
+    else:
+        await db.update_product_engagement(product_id, views_count=1)
+
+async def show_my_product_carousel(message_or_callback, user_id: int, product: Product, index: int,
+                                   total_count: int, edit_mode: bool = False):
     """
     Show product in carousel view
     
     Args:
         message_or_callback: Message or CallbackQuery object
         user_id: User ID
-        products: List of products
+        product: Product at the current position
         index: Current product index
+        total_count: Number of products in the carousel
         edit_mode: Whether we're editing an existing message
     """
-    if not products or index < 0 or index >= len(products):
-        return
-    
-    product = products[index]
+    counts = counter_buffer.counts(product)
     
     # Create detailed caption
     caption = format_product_caption(
@@ -147,7 +178,7 @@ async def show_my_product_carousel(message_or_callback, user_id: int, products:
     status_emoji = "✅" if product.is_active else "❌"
     caption += f"\n\n📊 **Your Product Stats:**\n"
     caption += f"Status: {status_emoji} {'Active' if product.is_active else 'Inactive'}\n"
-    caption += f"Views: {product.views_count}\n"
+    caption += f"Views: {counts['views_count']}\n"
     caption += f"Created: {escape_markdown(product.created_at.strftime('%b %d, %Y'))}\n\n"
     caption += f"🔧 /edit\\_buttons\\_{product.id}"
     
@@ -159,11 +190,11 @@ async def show_my_product_carousel(message_or_callback, user_id: int, products:
     keyboard = create_product_carousel_keyboard(
         product_id=product.id,
         current_index=index,
-        total_count=len(products),
+        total_count=total_count,
         show_admin_buttons=True,
         show_post_button=True,
-        likes_count=product.likes_count,
-        saves_count=product.saves_count,
+        likes_count=counts['likes_count'],
+        saves_count=counts['saves_count'],
         like_enabled=product.like_enabled,
         save_enabled=product.save_enabled,
         order_enabled=product.order_enabled,
@@ -173,21 +204,18 @@ async def show_my_product_carousel(message_or_callback, user_id: int, products:
     # Send or edit message
     try:
         if edit_mode and isinstance(message_or_callback, CallbackQuery):
-            # Edit existing message - use FSInputFile for media
-            photo = FSInputFile(product.image_path)
-            await message_or_callback.message.edit_media(
-                media=InputMediaPhoto(
-                    media=photo,
-                    caption=caption
-                ),
+            # Edit existing message (image sent by cached file_id when known)
+            await media_registry.edit_photo(
+                message_or_callback.message,
+                product.image_for(PREVIEW),
+                caption=caption,
                 reply_markup=keyboard
             )
         else:
             # Send new message
-            photo = FSInputFile(product.image_path)
             msg = message_or_callback if isinstance(message_or_callback, Message) else message_or_callback.message
-            await msg.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                msg.bot, msg.chat.id, product.image_for(PREVIEW),
                 caption=caption,
                 reply_markup=keyboard
             )
@@ -332,43 +360,31 @@ async def handle_category_selection(callback: CallbackQuery, state: FSMContext):
         logger.error(f"Error handling category selection: {e}")
         await callback.answer("❌ Error", show_alert=True)
 
-async def process_single_photo(message: Message, state: FSMContext):
+def _preview_paths(images: list, variants: list | None) -> list:
+    """Preview derivative for each image path, falling back to the image itself"""
+    variants = variants or []
+    return [
+        (variants[i] if i < len(variants) and variants[i] else {}).get(PREVIEW, path)
+        for i, path in enumerate(images)
+    ]
+
+def _main_variants(data: dict) -> dict:
+    """Derivatives of the main image recorded in the product FSM data"""
+    variants = data.get('all_variants') or []
+    main_index = data.get('main_image_index', 0)
+    return (variants[main_index] if main_index < len(variants) else None) or {}
+
+async def process_single_photo(message: Message, state: FSMContext, photo_data: dict):
     """Process a single photo (fallback for single image uploads)"""
-    photo = message.photo[-1]
-    user_id = message.from_user.id
-    timestamp = int(time.time() * 1000)
-    
-    # Get file info to determine extension
-    file = await message.bot.get_file(photo.file_id)
-    # Determine file extension from Telegram file_path (e.g., "photos/file_0.jpg" -> ".jpg")
-    file_extension = os.path.splitext(file.file_path)[1] if file.file_path else ".jpg"
-    if not file_extension:
-        file_extension = ".jpg"  # Default fallback
-    
-    file_name = f"{user_id}_{timestamp}_{photo.file_id}{file_extension}"
-    file_path = os.path.join(app_config.MEDIA_DIR, file_name)
-    
-    os.makedirs(app_config.MEDIA_DIR, exist_ok=True)
-    
-    await message.bot.download_file(file.file_path, file_path)
-    
-    # Get user info for watermark - prefer store name, then username.
-    # Do not fall back to a hardcoded value so missing data is visible.
-    user = await db.get_user(user_id)
-    if user:
-        store_name = user.store_name or user.username or ""
-    else:
-        store_name = ""
-    
-    # Watermark the image
-    watermarked_path = await add_watermark(file_path, store_name, file_path)
-    
+    # The photo was downloaded and watermarked when it arrived
     await state.update_data(
-        photo_path=watermarked_path,
-        photo_file_id=photo.file_id,
+        photo_path=photo_data['watermarked_path'],
+        original_photo_path=photo_data['original_path'],
+        photo_file_id=photo_data['file_id'],
         main_image_index=0,
-        all_images=[watermarked_path],
-        all_original_images=[file_path]
+        all_images=[photo_data['watermarked_path']],
+        all_original_images=[photo_data['original_path']],
+        all_variants=[photo_data.get('variants') or {}]
     )
     
     # Get product type from state
@@ -413,23 +429,18 @@ async def product_photo_received(message: Message, state: FSMContext):
 
         # Get the largest photo in this message
         photo = message.photo[-1]
-        timestamp = int(time.time() * 1000)
-
-        # Determine file extension from Telegram file_path
-        file = await message.bot.get_file(photo.file_id)
-        file_extension = os.path.splitext(file.file_path)[1] if file.file_path else ".jpg"
-        if not file_extension:
-            file_extension = ".jpg"
 
-        file_name = f"{user_id}_{timestamp}_{photo.file_id}{file_extension}"
-        file_path = os.path.join(app_config.MEDIA_DIR, file_name)
-
-        os.makedirs(app_config.MEDIA_DIR, exist_ok=True)
-        await message.bot.download_file(file.file_path, file_path)
+        # Watermark with the store name, then username. Do not fall back to
+        # a hardcoded value so missing data is visible.
+        user = await db.get_user(user_id)
+        store_name = (user.store_name or user.username or "") if user else ""
 
         # If this message is part of an album (media_group_id is set),
-        # buffer it in memory keyed by the group id. After a short delay,
-        # we'll process the whole album at once and send a single prompt.
+        # buffer it in memory keyed by the group id right away, with its
+        # download/watermark running in the background: updates for one chat
+        # are handled in order, so ingesting inline would delay the next
+        # part past the album timer. Once no part has arrived for a short
+        # while, we process the whole album at once and send a single prompt.
         if media_group_id:
             group_id = str(media_group_id)
             if group_id not in album_buffer:
@@ -437,10 +448,11 @@ async def product_photo_received(message: Message, state: FSMContext):
             album_buffer[group_id].append(
                 {
                     "message": message,
-                    "original_path": file_path,
+                    "ingest": asyncio.create_task(ingest_photo(message.bot, photo.file_id, store_name)),
                     "file_id": photo.file_id,
                 }
             )
+            album_last_part[group_id] = time.monotonic()
 
             # Schedule album processing only once per group id.
             if group_id not in album_tasks_scheduled:
@@ -448,10 +460,15 @@ async def product_photo_received(message: Message, state: FSMContext):
                 asyncio.create_task(_process_album_later(group_id, state))
             return
 
+        # Download into memory and store the original and watermarked copies
+        ingested = await ingest_photo(message.bot, photo.file_id, store_name)
+
         # For non-album photos, record directly into collected_photos
         collected_photos.append(
             {
-                "original_path": file_path,
+                "original_path": ingested.original_path,
+                "watermarked_path": ingested.watermarked_path,
+                "variants": ingested.variants,
                 "file_id": photo.file_id,
                 "media_group_id": None,
             }
@@ -494,20 +511,38 @@ async def product_photo_received(message: Message, state: FSMContext):
 
 
 async def _process_album_later(group_id: str, state: FSMContext):
-    """After a small delay, process a buffered album and send one prompt.
+    """Once an album's parts stop arriving, process it and send one prompt.
 
     This matches the common media_group pattern: buffer all parts keyed by
-    media_group_id, wait briefly so all items arrive, then treat them as a
-    single batch.
+    media_group_id, wait until no new part has arrived for
+    ALBUM_SETTLE_SECONDS, then treat them as a single batch.
     """
     try:
-        await asyncio.sleep(0.4)
-
-        photos = album_buffer.get(group_id)
+        while True:
+            quiet_for = time.monotonic() - album_last_part.get(group_id, 0)
+            if quiet_for >= ALBUM_SETTLE_SECONDS:
+                break
+            await asyncio.sleep(ALBUM_SETTLE_SECONDS - quiet_for)
+
+        # Take the album out before awaiting, so a late part starts a new batch
+        photos = album_buffer.pop(group_id, None)
+        album_last_part.pop(group_id, None)
+        album_tasks_scheduled.discard(group_id)
         if not photos:
-            # Nothing buffered; also clear any scheduled flag
-            if group_id in album_tasks_scheduled:
-                album_tasks_scheduled.discard(group_id)
+            return
+
+        # Wait for the background downloads; failed parts are left out
+        results = await asyncio.gather(*(item["ingest"] for item in photos), return_exceptions=True)
+        ingested_photos = []
+        for item, result in zip(photos, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error processing album photo {item['file_id']} in group {group_id}: {result}")
+            else:
+                ingested_photos.append((item, result))
+        if not ingested_photos:
+            await photos[-1]["message"].answer(
+                "❌ Error processing photo. Please try again.", reply_markup=create_cancel_keyboard()
+            )
             return
 
         # Use the last message in the album as the context for replies
@@ -517,10 +552,12 @@ async def _process_album_later(group_id: str, state: FSMContext):
         data = await state.get_data()
         collected_photos = data.get("collected_photos", [])
 
-        for item in photos:
+        for item, ingested in ingested_photos:
             collected_photos.append(
                 {
-                    "original_path": item["original_path"],
+                    "original_path": ingested.original_path,
+                    "watermarked_path": ingested.watermarked_path,
+                    "variants": ingested.variants,
                     "file_id": item["file_id"],
                     "media_group_id": group_id,
                 }
@@ -528,11 +565,6 @@ async def _process_album_later(group_id: str, state: FSMContext):
 
         await state.update_data(collected_photos=collected_photos)
 
-        # Clear buffer and scheduled flag for this album id
-        del album_buffer[group_id]
-        if group_id in album_tasks_scheduled:
-            album_tasks_scheduled.discard(group_id)
-
         # Recompute remaining capacity (max 8 photos total) now that the
         # album photos have been merged into state
         remaining = max(0, 8 - len(collected_photos))
@@ -561,32 +593,17 @@ async def _process_album_later(group_id: str, state: FSMContext):
         logger.error(f"Error processing album for group {group_id}: {e}")
 
 async def process_multiple_photos(message: Message, state: FSMContext, collected_photos: list):
-    """Process multiple photos: watermark each and ask for main image selection"""
+    """Process multiple photos (already watermarked on arrival) and ask for main image selection"""
     try:
-        user_id = message.from_user.id
-        user = await db.get_user(user_id)
-        if user:
-            store_name = user.store_name or user.username or ""
-        else:
-            store_name = ""
-        
-        # Watermark all photos separately
         watermarked_paths = []
         original_paths = []
+        variants = []
         
-        for i, photo_data in enumerate(collected_photos):
-            original_path = photo_data['original_path']
-            # Create watermarked version - save to separate file to preserve original
-            base, ext = os.path.splitext(original_path)
-            watermarked_path = f"{base}_watermarked{ext}"
-            
-            # Watermark the image (preserves original, creates new watermarked file)
-            watermarked_path = await add_watermark(original_path, store_name, watermarked_path)
-            
-            if watermarked_path and os.path.exists(watermarked_path):
-                watermarked_paths.append(watermarked_path)
-                original_paths.append(original_path)
-                logger.info(f"Watermarked image {i+1}/{len(collected_photos)}: {watermarked_path}")
+        for photo_data in collected_photos:
+            if os.path.exists(photo_data['watermarked_path']):
+                watermarked_paths.append(photo_data['watermarked_path'])
+                original_paths.append(photo_data['original_path'])
+                variants.append(photo_data.get('variants') or {})
         
         if not watermarked_paths:
             await message.answer("❌ Failed to process photos. Please try again.", reply_markup=create_cancel_keyboard())
@@ -595,17 +612,12 @@ async def process_multiple_photos(message: Message, state: FSMContext, collected
         # Store all images in state
         await state.update_data(
             all_images=watermarked_paths,
-            all_original_images=original_paths
+            all_original_images=original_paths,
+            all_variants=variants
         )
         
-        # Send all watermarked images as media group with selection buttons
-        media_group = []
-        for i, img_path in enumerate(watermarked_paths):
-            photo = FSInputFile(img_path)
-            media_group.append(InputMediaPhoto(media=photo))
-        
-        # Send media group
-        await message.answer_media_group(media=media_group)
+        # Send the previews as a media group to choose from
+        await media_registry.send_media_group(message.bot, message.chat.id, _preview_paths(watermarked_paths, variants))
         
         # Create selection buttons - one button per image
         buttons = []
@@ -649,7 +661,7 @@ async def handle_photos_done(callback: CallbackQuery, state: FSMContext):
         message = callback.message
 
         if len(collected_photos) == 1:
-            await process_single_photo(message, state)
+            await process_single_photo(message, state, collected_photos[0])
         else:
             await process_multiple_photos(message, state, collected_photos)
 
@@ -684,7 +696,8 @@ async def handle_main_image_selection(callback: CallbackQuery, state: FSMContext
             original_photo_path=main_original_path,
             main_image_index=main_index,
             all_images=all_images,
-            all_original_images=all_original_images
+            all_original_images=all_original_images,
+            all_variants=data.get("all_variants")
         )
         
         await callback.answer(f"✅ Image {main_index + 1} selected as main image")
@@ -799,9 +812,10 @@ async def show_custom_description_preview(message: Message, state: FSMContext):
     """Show preview for custom description product"""
     try:
         data = await state.get_data()
-        photo_path = data["photo_path"]  # Main image
-        all_images = data.get("all_images", [])
         main_image_index = data.get("main_image_index", 0)
+        # Previews are enough for the seller's check before creating
+        all_images = _preview_paths(data.get("all_images", []), data.get("all_variants"))
+        photo_path = all_images[main_image_index] if all_images else data["photo_path"]  # Main image
         description = data["description"]
         title = data.get("title", "")
         price = data.get("price", 0)
@@ -822,28 +836,22 @@ async def show_custom_description_preview(message: Message, state: FSMContext):
         # If we have multiple images, send media group (all except main) first, then main image
         if len(all_images) > 1:
             # Create media group with all images EXCEPT the main image
-            media_group = []
-            for i, img_path in enumerate(all_images):
-                if i != main_image_index:  # Skip main image
-                    photo = FSInputFile(img_path)
-                    media_group.append(InputMediaPhoto(media=photo))
+            gallery = [img_path for i, img_path in enumerate(all_images) if i != main_image_index]
             
             # Send media group if there are other images
-            if media_group:
-                await message.answer_media_group(media=media_group)
+            if gallery:
+                await media_registry.send_media_group(message.bot, message.chat.id, gallery)
             
             # Now send the main image with caption and buttons
-            main_photo = FSInputFile(photo_path)
-            await message.answer_photo(
-                photo=main_photo,
+            await media_registry.send_photo(
+                message.bot, message.chat.id, photo_path,
                 caption=caption,
                 reply_markup=keyboard
             )
         else:
             # Single image - just send it with caption and buttons
-            photo = FSInputFile(photo_path)
-            await message.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                message.bot, message.chat.id, photo_path,
                 caption=caption,
                 reply_markup=keyboard
             )
@@ -1012,9 +1020,10 @@ async def show_product_preview(message: Message, state: FSMContext):
     """Show product preview before creation"""
     try:
         data = await state.get_data()
-        photo_path = data["photo_path"]  # Main image
-        all_images = data.get("all_images", [])
         main_image_index = data.get("main_image_index", 0)
+        # Previews are enough for the seller's check before creating
+        all_images = _preview_paths(data.get("all_images", []), data.get("all_variants"))
+        photo_path = all_images[main_image_index] if all_images else data["photo_path"]  # Main image
         product_type = data.get("product_type", "standard")
         
         if product_type == "custom_description":
@@ -1058,35 +1067,25 @@ async def show_product_preview(message: Message, state: FSMContext):
         # If we have multiple images, send media group (all except main) first, then main image
         if len(all_images) > 1:
             # Create media group with all images EXCEPT the main image
-            media_group = []
-            for i, img_path in enumerate(all_images):
-                if i != main_image_index:  # Skip main image
-                    photo = FSInputFile(img_path)
-                    # Add caption only to first image in the group
-                    if len(media_group) == 0:
-                        media_group.append(InputMediaPhoto(
-                            media=photo,
-                            caption="📸 **Product Gallery**"
-                        ))
-                    else:
-                        media_group.append(InputMediaPhoto(media=photo))
+            gallery = [img_path for i, img_path in enumerate(all_images) if i != main_image_index]
             
-            # Send media group if there are other images
-            if media_group:
-                await message.answer_media_group(media=media_group)
+            # Send media group if there are other images (caption only on the first image)
+            if gallery:
+                await media_registry.send_media_group(
+                    message.bot, message.chat.id, gallery,
+                    first_caption="📸 **Product Gallery**"
+                )
             
             # Now send the main image with caption and buttons
-            main_photo = FSInputFile(photo_path)
-            await message.answer_photo(
-                photo=main_photo,
+            await media_registry.send_photo(
+                message.bot, message.chat.id, photo_path,
                 caption=caption,
                 reply_markup=keyboard
             )
         else:
             # Single image - just send it with caption and buttons
-            photo = FSInputFile(photo_path)
-            await message.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                message.bot, message.chat.id, photo_path,
                 caption=caption,
                 reply_markup=keyboard
             )
@@ -1112,6 +1111,10 @@ async def handle_confirm_product(callback: CallbackQuery, state: FSMContext):
         photo_path = data["photo_path"]              # watermarked main image
         original_photo_path = data.get("original_photo_path", photo_path)
         watermarked_path = photo_path
+        image_variants = None
+        all_variants = data.get("all_variants")
+        if isinstance(all_variants, list) and all_variants:
+            image_variants = all_variants[int(data.get("main_image_index") or 0)] or None
 
         # If multiple images were used, collect non-main images as gallery_paths
         gallery_paths = None
@@ -1137,6 +1140,7 @@ async def handle_confirm_product(callback: CallbackQuery, state: FSMContext):
                 image_path=watermarked_path,
                 original_image_path=original_photo_path,
                 gallery_images=gallery_paths,
+                image_variants=image_variants,
             )
         else:
             # Merge gallery images into category_fields under a private key
@@ -1154,6 +1158,7 @@ async def handle_confirm_product(callback: CallbackQuery, state: FSMContext):
                 field_values=field_values,
                 image_path=watermarked_path,
                 original_image_path=original_photo_path,
+                image_variants=image_variants,
             )
         
         await state.clear()
@@ -1193,6 +1198,7 @@ def create_custom_description_product(
     image_path: str,
     original_image_path: str,
     gallery_images: list[str] | None = None,
+    image_variants: dict | None = None,
 ) -> Product:
     """Create a custom-description product (sync ORM wrapped with sync_to_async).
 
@@ -1215,13 +1221,15 @@ def create_custom_description_product(
         category_fields=category_fields or None,
         image_path=image_path,
         original_image_path=original_image_path,
+        image_variants=image_variants or {},
     )
     product.save()
     return product
 
 @sync_to_async
 def create_standard_product(user_id: int, title: str, description: str, price: float, 
-                            category: str, field_values: dict, image_path: str, original_image_path: str) -> Product:
+                            category: str, field_values: dict, image_path: str, original_image_path: str,
+                            image_variants: dict | None = None) -> Product:
     """Create a standard product with category-specific fields (runs in thread via sync_to_async)."""
     from telegram_bot.models import User
 
@@ -1238,7 +1246,8 @@ def create_standard_product(user_id: int, title: str, description: str, price: f
         product_type="standard",
         category_fields=field_values,
         image_path=image_path,
-        original_image_path=original_image_path
+        original_image_path=original_image_path,
+        image_variants=image_variants or {}
     )
     product.save()
     return product
@@ -1270,17 +1279,10 @@ async def product_category_received(message: Message, state: FSMContext):
     
     # Get all data
     data = await state.get_data()
-    user = await db.get_user(message.from_user.id)
     
-    # Apply watermark using shop name (or username as fallback)
-    store_name = None
-    if user:
-        store_name = user.store_name or user.username or "Shop"
-    else:
-        store_name = "Shop"
-
-    watermarked_path = data['photo_path'].replace('.jpg', '_watermarked.jpg')
-    await add_watermark(data['photo_path'], store_name, watermarked_path)
+    # The photo was watermarked when it was ingested
+    watermarked_path = data['photo_path']
+    main_variants = _main_variants(data)
     
     await state.update_data(watermarked_path=watermarked_path)
     
@@ -1295,8 +1297,6 @@ async def product_category_received(message: Message, state: FSMContext):
     )
     
     # Send preview
-    photo = FSInputFile(watermarked_path)
-    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="✅ Save Product", callback_data="product_save"),
@@ -1304,8 +1304,8 @@ async def product_category_received(message: Message, state: FSMContext):
         ]
     ])
     
-    await message.answer_photo(
-        photo=photo,
+    await media_registry.send_photo(
+        message.bot, message.chat.id, _preview_paths([watermarked_path], [main_variants])[0],
         caption=f"📦 **Product Preview**\n\n{caption}\n\n"
                 "Does everything look good?",
         reply_markup=keyboard
@@ -1329,7 +1329,8 @@ async def product_save_confirmed(callback: CallbackQuery, state: FSMContext):
         price=data['price'],
         category=data.get('category'),
         image_path=data['watermarked_path'],
-        original_image_path=data['photo_path']
+        original_image_path=data.get('original_photo_path', data['photo_path']),
+        image_variants=_main_variants(data)
     )
     
     logger.info(f"Product created: {product.id} by seller {user.id}")
@@ -1355,15 +1356,9 @@ async def product_cancel(callback: CallbackQuery, state: FSMContext):
     """Cancel product creation"""
     await callback.answer()
     
-    # Clean up uploaded files
+    # Clean up uploaded files (store blobs may be shared and are left to gc_media)
     data = await state.get_data()
-    try:
-        if 'photo_path' in data and os.path.exists(data['photo_path']):
-            os.remove(data['photo_path'])
-        if 'watermarked_path' in data and os.path.exists(data['watermarked_path']):
-            os.remove(data['watermarked_path'])
-    except:
-        pass
+    release_legacy([data.get('photo_path'), data.get('watermarked_path')])
     
     await callback.message.edit_caption(
         caption="❌ Product creation cancelled."
@@ -1416,10 +1411,8 @@ async def post_product_now(callback: CallbackQuery, state: FSMContext):
         )
         
         # Post to channel
-        photo = FSInputFile(product.image_path)
-        sent = await callback.bot.send_photo(
-            chat_id=user.channel_username,
-            photo=photo,
+        sent = await media_registry.send_photo(
+            callback.bot, user.channel_username, product.image_for(FULL),
             caption=caption,
             reply_markup=keyboard
         )
@@ -1471,21 +1464,25 @@ async def cmd_my_products(message: Message, state: FSMContext):
         await message.answer("❌ This command is only for sellers.")
         return
     
-    products = await db.get_seller_products(user_id, active_only=False)
+    product_ids = await db.get_seller_product_ids(user_id, active_only=False)
     
-    if not products:
+    if not product_ids:
         await message.answer(
             "📦 **No products yet!**\n\n"
             "Add your first product with /addproduct"
         )
         return
     
-    # Store products in state for navigation
-    product_ids = [p.id for p in products]
+    # Store only the IDs in state; products are fetched a window at a time
     await state.update_data(myproducts_ids=product_ids, myproducts_user_id=user_id)
     
     # Show first product in carousel view
-    await show_my_product_carousel(message, user_id, products, 0)
+    products = await _carousel_products(user_id, product_ids, 0)
+    product = products.get(product_ids[0])
+    if product is None:
+        await message.answer("❌ Error loading product")
+        return
+    await show_my_product_carousel(message, user_id, product, 0, len(product_ids))
 
 @router.callback_query(F.data.startswith("myproducts_nav_"))
 async def handle_myproducts_navigation(callback: CallbackQuery, state: FSMContext):
@@ -1503,25 +1500,39 @@ async def handle_myproducts_navigation(callback: CallbackQuery, state: FSMContex
             await callback.answer("❌ Session expired. Please use /myproducts again.", show_alert=True)
             return
         
-        # Get all products
-        products = []
-        for product_id in product_ids:
-            product = await db.get_product(product_id)
-            if product:
-                products.append(product)
-        
-        if not products or index < 0 or index >= len(products):
+        if index < 0 or index >= len(product_ids):
             await callback.answer("❌ Invalid product index", show_alert=True)
             return
         
+        # Fetch just this product; the previous tap usually prefetched it
+        products = await _carousel_products(user_id, product_ids, index, neighbours=False)
+        product = products.get(product_ids[index])
+        
+        if product is None:
+            # Deleted since /myproducts: drop it and stay in range
+            product_ids = product_ids[:index] + product_ids[index + 1:]
+            await state.update_data(myproducts_ids=product_ids)
+            if not product_ids:
+                await callback.answer("📦 No products left. Add one with /addproduct", show_alert=True)
+                return
+            index = min(index, len(product_ids) - 1)
+            products = await _carousel_products(user_id, product_ids, index, neighbours=False)
+            product = products.get(product_ids[index])
+            if product is None:
+                await callback.answer("❌ Session expired. Please use /myproducts again.", show_alert=True)
+                return
+        
         # Show the selected product
-        await show_my_product_carousel(callback, user_id, products, index, edit_mode=True)
+        await show_my_product_carousel(callback, user_id, product, index, len(product_ids), edit_mode=True)
         
         # Answer callback
         try:
             await callback.answer()
         except:
             pass  # Ignore timeout errors
+        
+        # Prefetch the neighbours so the next tap in either direction hits memory
+        await _carousel_products(user_id, product_ids, index)
             
     except Exception as e:
         logger.error(f"Error handling product navigation: {e}")
@@ -1573,9 +1584,8 @@ async def cmd_edit_buttons(message: Message):
     
     # Send product with image
     try:
-        photo = FSInputFile(product.image_path)
-        await message.answer_photo(
-            photo=photo,
+        await media_registry.send_photo(
+            message.bot, message.chat.id, product.image_for(PREVIEW),
             caption=caption,
             reply_markup=keyboard
         )
@@ -1601,6 +1611,8 @@ async def cmd_view_product(message: Message):
     # Check if user is the owner
     user_id = message.from_user.id
     is_owner = (product.seller_id == user_id)
+    if not is_owner:
+        await _record_view(product_id)
     
     # Get seller info
     seller = await db.get_user(product.seller_id)
@@ -1652,10 +1664,8 @@ async def cmd_view_product(message: Message):
     
     # Send product with image
     try:
-        from aiogram.types import FSInputFile
-        photo = FSInputFile(product.image_path)
-        await message.answer_photo(
-            photo=photo,
+        await media_registry.send_photo(
+            message.bot, message.chat.id, product.image_for(PREVIEW),
             caption=caption,
             reply_markup=keyboard
         )
@@ -1735,26 +1745,16 @@ async def handle_post_to_channel(callback: CallbackQuery):
             if getattr(product, "category_fields", None):
                 gallery_images = product.category_fields.get("_gallery_images")
 
-            from aiogram.types import FSInputFile, InputMediaPhoto
-
             if isinstance(gallery_images, list) and gallery_images:
-                media_group = []
-                for path in gallery_images:
-                    try:
-                        media_group.append(InputMediaPhoto(media=FSInputFile(path)))
-                    except Exception:
-                        continue
-                if media_group:
-                    await callback.bot.send_media_group(
-                        chat_id=seller.channel_username,
-                        media=media_group,
+                gallery = [path for path in gallery_images if os.path.exists(path)]
+                if gallery:
+                    await media_registry.send_media_group(
+                        callback.bot, seller.channel_username, gallery
                     )
 
             # Now send the main image with caption and inline buttons
-            photo = FSInputFile(product.image_path)
-            sent = await callback.bot.send_photo(
-                chat_id=seller.channel_username,
-                photo=photo,
+            sent = await media_registry.send_photo(
+                callback.bot, seller.channel_username, product.image_for(FULL),
                 caption=caption,
                 reply_markup=keyboard,
             )
@@ -1838,21 +1838,23 @@ async def handle_mark_sold(callback: CallbackQuery):
             category_fields=getattr(product, 'category_fields', None),
             for_channel=True
         )
-        # Update all posts
-        for p in posts:
-            try:
-                await callback.bot.edit_message_caption(
-                    chat_id=p.channel_username,
-                    message_id=p.message_id,
-                    caption=new_caption,
-                    parse_mode="MarkdownV2"
-                )
-            except Exception as e:
-                logger.error(f"Failed to edit post {p.message_id} in {p.channel_username}: {e}")
+        # Answer first: paced channel edits can outlast the callback timeout
         try:
             await callback.answer("✅ Marked as sold in channel posts")
         except:
             pass
+        # Update all posts (bulk lane: queued behind interactive replies)
+        with outbound_priority(BULK):
+            for p in posts:
+                try:
+                    await callback.bot.edit_message_caption(
+                        chat_id=p.channel_username,
+                        message_id=p.message_id,
+                        caption=new_caption,
+                        parse_mode="MarkdownV2"
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to edit post {p.message_id} in {p.channel_username}: {e}")
     except Exception as e:
         logger.error(f"Error marking sold: {e}")
         try:
@@ -2080,9 +2082,8 @@ async def handle_edit_product(callback: CallbackQuery):
         
         # Send product with edit keyboard
         if product.image_path and os.path.exists(product.image_path):
-            photo = FSInputFile(product.image_path)
-            await callback.message.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                callback.bot, callback.message.chat.id, product.image_for(PREVIEW),
                 caption=caption,
                 parse_mode="MarkdownV2",
                 reply_markup=create_edit_keyboard(product_id)
@@ -2323,6 +2324,8 @@ async def handle_back_to_product(callback: CallbackQuery):
         
         # Check if user is owner (show admin buttons) or regular viewer
         is_owner = product.seller_id == user_id
+        if not is_owner:
+            await _record_view(product_id)
         
         # Get seller info
         seller = await db.get_user(product.seller_id)
@@ -2372,9 +2375,8 @@ async def handle_back_to_product(callback: CallbackQuery):
         
         # Send product
         if product.image_path and os.path.exists(product.image_path):
-            photo = FSInputFile(product.image_path)
-            await callback.message.answer_photo(
-                photo=photo,
+            await media_registry.send_photo(
+                callback.bot, callback.message.chat.id, product.image_for(PREVIEW),
                 caption=caption,
                 parse_mode="MarkdownV2",
                 reply_markup=keyboard
@@ -2409,7 +2411,7 @@ async def handle_edit_title_input(message: Message, state: FSMContext):
         product = await db.get_product(product_id)
         if product:
             product.title = new_title
-            product.save()
+            await sync_to_async(product.save)()
         
         await state.clear()
         
@@ -2439,7 +2441,7 @@ async def handle_edit_description_input(message: Message, state: FSMContext):
         product = await db.get_product(product_id)
         if product:
             product.description = new_description
-            product.save()
+            await sync_to_async(product.save)()
         
         await state.clear()
         
@@ -2478,7 +2480,7 @@ async def handle_edit_price_input(message: Message, state: FSMContext):
         product = await db.get_product(product_id)
         if product:
             product.price = new_price
-            product.save()
+            await sync_to_async(product.save)()
         
         await state.clear()
         
@@ -2512,7 +2514,7 @@ async def handle_edit_category_input(message: Message, state: FSMContext):
         product = await db.get_product(product_id)
         if product:
             product.category = new_category
-            product.save()
+            await sync_to_async(product.save)()
         
         await state.clear()
         
@@ -2544,16 +2546,6 @@ async def handle_edit_photo_input(message: Message, state: FSMContext):
         # Get the highest quality photo
         photo = message.photo[-1]
         
-        # Download and save photo
-        file = await message.bot.get_file(photo.file_id)
-        file_path = f"{app_config.MEDIA_DIR}/product_{product_id}_{int(time.time())}.jpg"
-        
-        # Ensure directory exists
-        os.makedirs(app_config.MEDIA_DIR, exist_ok=True)
-        
-        # Download photo
-        await message.bot.download_file(file.file_path, file_path)
-        
         # Get seller info for watermark
         user = await db.get_user(message.from_user.id)
         if user:
@@ -2561,18 +2553,21 @@ async def handle_edit_photo_input(message: Message, state: FSMContext):
         else:
             store_name = "Shop"
         
-        # Add watermark
-        watermarked_path = await add_watermark(file_path, store_name)
+        # Download and store the original and watermarked photo
+        ingested = await ingest_photo(message.bot, photo.file_id, store_name)
         
         # Update product photo in database
         product = await db.get_product(product_id)
         if product:
-            # Delete old photo if it exists
-            if product.image_path and os.path.exists(product.image_path):
-                os.remove(product.image_path)
+            old_paths = {product.image_path, product.original_image_path, *(product.image_variants or {}).values()}
             
-            product.image_path = watermarked_path
-            product.save()
+            product.image_path = ingested.watermarked_path
+            product.original_image_path = ingested.original_path
+            product.image_variants = ingested.variants
+            await sync_to_async(product.save)()
+            
+            # Old pre-store files go now; shared store blobs are left to gc_media
+            release_legacy(old_paths)
         
         await state.clear()
         
@@ -2609,12 +2604,10 @@ async def handle_delete_confirmation(message: Message, state: FSMContext):
         # Delete product from database
         product = await db.get_product(product_id)
         if product:
-            # Delete photo file if it exists
-            if product.image_path and os.path.exists(product.image_path):
-                os.remove(product.image_path)
-            
-            # Delete from database
-            product.delete()
+            # Delete from database, then any pre-store image files it owned
+            # (originals and gallery included; store blobs are left to gc_media)
+            await sync_to_async(product.delete)()
+            release_legacy(product_media_paths(product))
         
         await state.clear()
         
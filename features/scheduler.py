@@ -2,25 +2,36 @@
 Scheduler feature
 Handles automatic posting of products to channels
 """
+import asyncio
+import os
+import socket
+import uuid
+from collections import defaultdict, deque
 from datetime import datetime, timedelta
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.triggers.cron import CronTrigger
+from django.utils import timezone
 
+from database.counters import counter_buffer
 from database.db import db
+from utils.due_scheduler import due_scheduler
 from utils.helpers import format_product_caption, create_product_keyboard, calculate_next_post_time
+from utils.ingest import FULL
+from utils import media_registry
 from utils.logger import logger
+from utils.outbound import BULK, outbound_priority
 from config import app_config, bot_config
 
 router = Router()
-scheduler = AsyncIOScheduler()
+
+# Identifies this process in schedule leases (several bot workers may run).
+# Hostname is cut so "host:pid:8hex" always fits PostSchedule.claimed_by (64)
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}"
 
 # FSM States for scheduling
 class ScheduleStates(StatesGroup):
@@ -208,13 +219,8 @@ async def cmd_view_schedules(message: Message):
         await message.answer("❌ This command is only for sellers.")
         return
     
-    # Get user's schedules using Django ORM
-    from telegram_bot.models import PostSchedule, Product
-    
-    schedules = list(PostSchedule.objects.filter(
-        seller_id=user_id,
-        is_active=True
-    ).order_by('next_post_at'))
+    # Get user's schedules (products joined in the same query)
+    schedules = await db.get_seller_schedules(user_id)
     
     if not schedules:
         await message.answer(
@@ -226,7 +232,7 @@ async def cmd_view_schedules(message: Message):
     response = f"⏰ **Your Schedules** ({len(schedules)})\n\n"
     
     for i, schedule in enumerate(schedules, 1):
-        product = await db.get_product(schedule.product_id)
+        product = schedule.product
         interval_text = "day" if schedule.interval_days == 1 else f"{schedule.interval_days} days"
         
         response += (
@@ -243,91 +249,156 @@ async def cmd_view_schedules(message: Message):
     await message.answer(response)
 
 # Background job to check and post scheduled products
-async def check_and_post_scheduled(bot: Bot):
-    """Background task to check schedules and post products"""
+# Guards against overlapping runs
+_run_lock = asyncio.Lock()
+
+async def check_and_post_scheduled(bot: Bot) -> set[int]:
+    """Background task to check schedules and post products; returns the ids it claimed"""
+    if _run_lock.locked():
+        logger.warning("Previous scheduled posting run still in progress, skipping this tick")
+        return set()
+    
+    claimed = set()
+    async with _run_lock:
+        # Autoposts yield to interactive replies in the outbound queue
+        with outbound_priority(BULK):
+            # Keep claiming while batches come back full, so a burst of due
+            # schedules drains in one run instead of one batch per retry delay
+            while True:
+                batch = await _post_due_schedules(bot, exclude_ids=claimed)
+                claimed.update(batch)
+                if len(batch) < app_config.SCHEDULE_CLAIM_BATCH:
+                    return claimed
+
+async def _post_due_schedules(bot: Bot, exclude_ids=None) -> list[int]:
+    """Post a batch of schedules whose time has come; returns the ids claimed"""
     try:
-        now = datetime.now()
-        schedules = await db.get_active_schedules()
+        now = timezone.now()
+        # Lease due rows to this run (product and seller joined in the same
+        # query); other workers skip them until the lease is released or expires
+        token = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        schedules = await db.claim_due_schedules(
+            now, token,
+            lease_seconds=app_config.SCHEDULE_CLAIM_TTL,
+            limit=app_config.SCHEDULE_CLAIM_BATCH,
+            exclude_ids=list(exclude_ids or ())
+        )
+        if not schedules:
+            return []
+        
+        # Round-robin across channels so one busy channel cannot starve the rest;
+        # posts to the same channel go out one at a time
+        semaphore = asyncio.Semaphore(app_config.SCHEDULER_CONCURRENCY)
+        channel_locks = defaultdict(asyncio.Lock)
+        
+        async def run(schedule):
+            async with channel_locks[schedule.channel_username], semaphore:
+                await _post_schedule(bot, schedule, now, token)
         
-        for schedule in schedules:
-            # Check if it's time to post
-            if schedule.next_post_at and schedule.next_post_at <= now:
-                try:
-                    # Get product and seller
-                    product = await db.get_product(schedule.product_id)
-                    seller = await db.get_user(schedule.seller_id)
-                    
-                    if not product or not product.is_active:
-                        continue
-                    
-                    # Create caption and keyboard
-                    caption = format_product_caption(
-                        title=product.title,
-                        description=product.description,
-                        price=product.price,
-                        category=product.category,
-                        engagement_stats={
-                            'likes_count': product.likes_count,
-                            'saves_count': product.saves_count,
-                            'orders_count': product.orders_count
-                        }
-                    )
-                    
-                    custom_button = None
-                    if product.custom_button_text and product.custom_button_url:
-                        custom_button = (product.custom_button_text, product.custom_button_url)
-                    
-                    keyboard = create_product_keyboard(
-                        product_id=product.id,
-                        seller_phone=seller.phone,
-                        custom_button=custom_button,
-                        likes_count=product.likes_count,
-                        saves_count=product.saves_count,
-                        like_enabled=product.like_enabled,
-                        save_enabled=product.save_enabled,
-                        order_enabled=product.order_enabled
-                    )
-                    
-                    # Post to channel
-                    photo = FSInputFile(product.image_path)
-                    await bot.send_photo(
-                        chat_id=schedule.channel_username,
-                        photo=photo,
-                        caption=caption,
-                        reply_markup=keyboard
-                    )
-                    
-                    # Calculate next post time
-                    next_post = calculate_next_post_time(schedule.interval_days, schedule.post_time)
-                    
-                    # Update schedule
-                    await db.update_schedule_post_time(schedule.id, now, next_post)
-                    
-                    logger.info(f"Scheduled post completed: schedule {schedule.id}, product {product.id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error posting scheduled product {schedule.id}: {e}")
+        await asyncio.gather(*(run(schedule) for schedule in _interleave_by_channel(schedules)))
+        logger.info(f"Scheduled posting run finished: {len(schedules)} due schedules")
+        return [schedule.id for schedule in schedules]
         
     except Exception as e:
         logger.error(f"Error in scheduled posting job: {e}")
+        return []
+
+def _interleave_by_channel(schedules: list) -> list:
+    """Order schedules round-robin by channel, keeping due order within a channel"""
+    by_channel = defaultdict(deque)
+    for schedule in schedules:
+        by_channel[schedule.channel_username].append(schedule)
+    
+    ordered = []
+    while by_channel:
+        for channel in list(by_channel):
+            ordered.append(by_channel[channel].popleft())
+            if not by_channel[channel]:
+                del by_channel[channel]
+    return ordered
+
+async def _post_schedule(bot: Bot, schedule, now, token: str):
+    """Post one claimed schedule, then move it forward and release the lease"""
+    try:
+        # Product and seller are joined by claim_due_schedules
+        product = schedule.product
+        seller = schedule.seller
+        
+        if not product or not product.is_active:
+            await db.release_schedule_claim(schedule.id, token)
+            return
+        
+        # Create caption and keyboard
+        counts = counter_buffer.counts(product)
+        caption = format_product_caption(
+            title=product.title,
+            description=product.description,
+            price=product.price,
+            category=product.category,
+            engagement_stats={
+                **counts,
+                'orders_count': product.orders_count
+            }
+        )
+        
+        custom_button = None
+        if product.custom_button_text and product.custom_button_url:
+            custom_button = (product.custom_button_text, product.custom_button_url)
+        
+        keyboard = create_product_keyboard(
+            product_id=product.id,
+            seller_phone=seller.phone,
+            custom_button=custom_button,
+            likes_count=counts['likes_count'],
+            saves_count=counts['saves_count'],
+            like_enabled=product.like_enabled,
+            save_enabled=product.save_enabled,
+            order_enabled=product.order_enabled
+        )
+        
+        # A batch posts slowly (one post per channel at a time); renew the
+        # lease right before sending so it cannot expire and be re-claimed
+        # by another worker while this post is still pending
+        if not await db.extend_schedule_claim(schedule.id, token, app_config.SCHEDULE_CLAIM_TTL):
+            logger.warning(f"Lease on schedule {schedule.id} was taken over, skipping post")
+            return
+        
+        # Post to channel (reuses the cached file_id instead of re-uploading)
+        await media_registry.send_photo(
+            bot, schedule.channel_username, product.image_for(FULL),
+            caption=caption,
+            reply_markup=keyboard
+        )
+        
+        # Calculate next post time
+        next_post = calculate_next_post_time(schedule.interval_days, schedule.post_time)
+        
+        # Update schedule and release the lease
+        if not await db.complete_schedule_claim(schedule.id, token, now, next_post):
+            logger.warning(f"Lease on schedule {schedule.id} expired before the post was recorded")
+        
+        logger.info(f"Scheduled post completed: schedule {schedule.id}, product {product.id}")
+        
+    except Exception as e:
+        logger.error(f"Error posting scheduled product {schedule.id}: {e}")
+        try:
+            await db.release_schedule_claim(schedule.id, token)
+        except Exception as release_error:
+            logger.error(f"Error releasing schedule {schedule.id}: {release_error}")
 
 def start_scheduler(bot: Bot):
-    """Start the scheduler with periodic checks"""
-    # Check every 5 minutes for scheduled posts
-    scheduler.add_job(
-        check_and_post_scheduled,
-        trigger=IntervalTrigger(minutes=5),
-        args=[bot],
-        id='check_schedules',
-        replace_existing=True
+    """Start the due-time scheduler (must be called from the running event loop)"""
+    async def on_due(schedule_ids: list[int]) -> set[int]:
+        return await check_and_post_scheduled(bot)
+    
+    # Sleeps until the earliest next_post_at; schedule saves in this process
+    # wake it early, saves elsewhere are polled for
+    due_scheduler.start(
+        load=db.get_schedule_due_times, on_due=on_due, poll=db.get_schedule_due_changes
     )
-    
-    scheduler.start()
     logger.info("Scheduler started")
 
 def stop_scheduler():
     """Stop the scheduler"""
-    scheduler.shutdown()
+    due_scheduler.stop()
     logger.info("Scheduler stopped")
-
-
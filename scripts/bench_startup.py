@@ -0,0 +1,70 @@
+"""
+Startup benchmark
+Measures a cold import of each feature module, the first build of the
+webhook dispatcher, and repeat builds (cached now, versus the old
+importlib.reload of every router module)
+
+Usage: python scripts/bench_startup.py [--runs N]
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ethiostore.settings')
+
+started = time.perf_counter()
+import django
+
+django.setup()
+setup_seconds = time.perf_counter() - started
+
+from aiogram import Dispatcher
+
+from telegram_bot import views
+
+
+def legacy_build() -> Dispatcher:
+    """The previous build_dispatcher: re-execute every router module"""
+    dispatcher = Dispatcher()
+    for module_path in views.ROUTER_MODULES:
+        module = importlib.reload(importlib.import_module(module_path))
+        dispatcher.include_router(module.router)
+    return dispatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'django.setup()':>30} | {setup_seconds * 1000:>8.1f} ms")
+    for module_path in views.ROUTER_MODULES:
+        already = module_path in sys.modules
+        started = time.perf_counter()
+        importlib.import_module(module_path)
+        note = ' (already imported)' if already else ''
+        print(f"{'import ' + module_path:>30} | {(time.perf_counter() - started) * 1000:>8.1f} ms{note}")
+
+    started = time.perf_counter()
+    views.build_dispatcher()
+    print(f"{'first build_dispatcher':>30} | {(time.perf_counter() - started) * 1000:>8.1f} ms")
+
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        views.build_dispatcher()
+    cached = (time.perf_counter() - started) / args.runs
+    print(f"{'repeat build (cached)':>30} | {cached * 1000:>8.3f} ms")
+
+    # Last, since reloading replaces the modules the cached dispatcher uses
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        legacy_build()
+    legacy = (time.perf_counter() - started) / args.runs
+    print(f"{'repeat build (reload)':>30} | {legacy * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Watermark benchmark
+Compares the old full-frame overlay renderer with the cached label tile
+renderer in utils.watermark, on synthetic JPEGs of typical upload sizes
+
+Usage: python scripts/bench_watermark.py [--runs N] [--store NAME]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageDraw
+
+from config import app_config
+from utils.watermark import _font_size, _label_tile, _load_font, watermark_image
+
+SIZES = [(800, 600), (1280, 960), (2560, 1920), (4000, 3000)]
+
+
+def legacy_watermark(image_path: str, store_name: str, output_path: str) -> str:
+    """The previous renderer: a full-size RGBA overlay per image"""
+    with Image.open(image_path) as img:
+        image = img.convert('RGBA')
+    txt_layer = Image.new('RGBA', image.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(txt_layer)
+    img_width, img_height = image.size
+    font = _load_font(_font_size(img_width))
+    watermark_text = f"{store_name} x @ethiostorebot"
+    bbox = draw.textbbox((0, 0), watermark_text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = img_width - text_width - 20
+    y = img_height - text_height - 20
+    draw.rectangle([x - 10, y - 10, x + text_width + 10, y + text_height + 10], fill=(0, 0, 0, 120))
+    draw.text((x, y), watermark_text, font=font, fill=(255, 255, 255, app_config.WATERMARK_OPACITY))
+    Image.alpha_composite(image, txt_layer).convert('RGB').save(output_path, quality=95, optimize=False)
+    return output_path
+
+
+def measure(fn, source: str, store: str, target: str, runs: int) -> float:
+    """Mean seconds per call"""
+    fn(source, store, target)  # warm font and label caches
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(source, store, target)
+    return (time.perf_counter() - started) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--store', default='Addis Electronics')
+    args = parser.parse_args()
+
+    print(f"{'size':>11} | {'legacy ms':>9} | {'tiled ms':>8} | {'speedup':>7} | "
+          f"{'legacy overlay':>14} | {'tiled overlay':>13} | max diff")
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in SIZES:
+            source = os.path.join(tmp, f'src_{width}.jpg')
+            gradient = Image.linear_gradient('L').resize((width, height))
+            Image.merge('RGB', (gradient, gradient.rotate(90), gradient)).save(source, quality=92)
+
+            legacy_out = os.path.join(tmp, f'legacy_{width}.jpg')
+            tiled_out = os.path.join(tmp, f'tiled_{width}.jpg')
+            legacy_time = measure(legacy_watermark, source, args.store, legacy_out, args.runs)
+            tiled_time = measure(watermark_image, source, args.store, tiled_out, args.runs)
+
+            # RGBA overlay each renderer allocates per image
+            tile, _, _ = _label_tile(args.store, _font_size(width), app_config.WATERMARK_OPACITY)
+            legacy_bytes = width * height * 4
+            tiled_bytes = tile.width * tile.height * 4
+
+            with Image.open(legacy_out) as a, Image.open(tiled_out) as b:
+                diff = max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+            print(f"{width:>5}x{height:<5} | {legacy_time * 1000:>9.1f} | {tiled_time * 1000:>8.1f} | "
+                  f"{legacy_time / tiled_time:>6.2f}x | {legacy_bytes / 1e6:>12.1f}MB | "
+                  f"{tiled_bytes / 1e3:>11.1f}KB | {diff}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Webhook parsing benchmark
+Compares the old webhook parse (json.loads, Update.model_validate, then the
+dump/re-validate remount in feed_update) with telegram_bot.views.parse_update
+over a corpus of update payloads
+
+The built-in corpus is SYNTHETIC: hand-written payloads shaped like the
+ones the bot receives, one per update type. Its numbers show the relative
+cost of the two parse paths, not production latency. For that, pass
+--fixture with a JSON Lines file of recorded (anonymised) webhook bodies,
+one update per line; each is timed and labelled by its update type.
+
+Usage: python scripts/bench_webhook_parse.py [--runs N] [--fixture updates.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ethiostore.settings')
+
+import django
+
+django.setup()
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from config import app_config
+from telegram_bot import views
+
+USER = {"id": 512345678, "is_bot": False, "first_name": "Abebe", "last_name": "Kebede",
+        "username": "abebe_k", "language_code": "en"}
+CHAT = {"id": 512345678, "first_name": "Abebe", "last_name": "Kebede", "username": "abebe_k",
+        "type": "private"}
+BOT_USER = {"id": 7000000001, "is_bot": True, "first_name": "EthioStore", "username": "ethiostorebot"}
+CHANNEL = {"id": -1001234567890, "title": "Addis Electronics", "username": "addis_electronics",
+           "type": "channel"}
+PHOTO = [
+    {"file_id": f"AgACAgQAAxkBAAIB{size}X2Vx_abcdefghijklmnopqrstuvwxyz0123456789",
+     "file_unique_id": f"AQADu7Ix{size}", "file_size": size * 90, "width": size, "height": size * 3 // 4}
+    for size in (90, 320, 800, 1280)
+]
+KEYBOARD = {"inline_keyboard": [
+    [{"text": "⬅️ Prev", "callback_data": "myprod_prev:3"},
+     {"text": "3/12", "callback_data": "noop"},
+     {"text": "Next ➡️", "callback_data": "myprod_next:3"}],
+    [{"text": "✏️ Edit", "callback_data": "edit_product:481"},
+     {"text": "🗑 Delete", "callback_data": "delete_product:481"}],
+    [{"text": "🛒 Order", "url": "https://t.me/ethiostorebot?start=order_481"}],
+]}
+CAPTION = ("📦 *Samsung Galaxy A54 5G*\n\n💰 Price: 32,500 ETB\n📍 Location: Bole, Addis Ababa\n"
+           "📝 Brand new, 128GB, sealed box with 1 year warranty. Delivery available.\n\n#phones #samsung")
+
+CORPUS = {
+    'command': {"update_id": 900000001, "message": {
+        "message_id": 1201, "from": USER, "chat": CHAT, "date": 1760000000, "text": "/start ref_42",
+        "entities": [{"offset": 0, "length": 6, "type": "bot_command"}]}},
+    'text': {"update_id": 900000002, "message": {
+        "message_id": 1202, "from": USER, "chat": CHAT, "date": 1760000001,
+        "text": "Samsung Galaxy A54 5G, 128GB, brand new sealed"}},
+    'photo': {"update_id": 900000003, "message": {
+        "message_id": 1203, "from": USER, "chat": CHAT, "date": 1760000002,
+        "media_group_id": "13579246801357924", "photo": PHOTO, "caption": "Front and back"}},
+    'callback': {"update_id": 900000004, "callback_query": {
+        "id": "2200000000000000001", "from": USER, "chat_instance": "-4455667788990011223",
+        "data": "myprod_next:3", "message": {
+            "message_id": 1204, "from": BOT_USER, "chat": CHAT, "date": 1760000003,
+            "photo": PHOTO, "caption": CAPTION, "reply_markup": KEYBOARD,
+            "caption_entities": [{"offset": 3, "length": 21, "type": "bold"}]}}},
+    'inline_query': {"update_id": 900000005, "inline_query": {
+        "id": "3300000000000000001", "from": USER, "query": "samsung a54", "offset": "",
+        "chat_type": "sender"}},
+    'channel_post': {"update_id": 900000006, "channel_post": {
+        "message_id": 88, "sender_chat": CHANNEL, "chat": CHANNEL, "date": 1760000005,
+        "photo": PHOTO, "caption": CAPTION, "reply_markup": KEYBOARD}},
+}
+
+
+def load_fixture(path: str) -> dict:
+    """Recorded updates keyed '<n>:<update type>', in file order"""
+    corpus = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            payload = json.loads(line)
+            kind = next((key for key in payload if key != 'update_id'), 'unknown')
+            corpus[f"{len(corpus) + 1}:{kind}"] = payload
+    return corpus
+
+
+def legacy_parse(body: bytes, bot: Bot) -> Update:
+    """The previous path, including feed_update's remount of an unbound update"""
+    update = Update.model_validate(json.loads(body))
+    return Update.model_validate(update.model_dump(), context={"bot": bot})
+
+
+def measure(fn, body: bytes, bot: Bot, runs: int) -> float:
+    """Mean microseconds per call"""
+    fn(body, bot)
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(body, bot)
+    return (time.perf_counter() - started) / runs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5000)
+    parser.add_argument('--fixture', help='JSON Lines file of recorded, anonymised update bodies')
+    args = parser.parse_args()
+    if args.fixture:
+        corpus = load_fixture(args.fixture)
+        print(f"corpus: {len(corpus)} recorded updates from {args.fixture}")
+    else:
+        corpus = CORPUS
+        print("corpus: synthetic payloads (pass --fixture for recorded updates)")
+
+    bot = Bot(token='123456:benchmark-token')
+    backends = {'legacy': legacy_parse}
+    for backend in ('pydantic', 'orjson'):
+        if backend == 'orjson' and views.orjson is None:
+            continue
+
+        def parse(body, bot, backend=backend):
+            app_config.WEBHOOK_JSON_BACKEND = backend
+            return views.parse_update(body, bot)
+        backends[backend] = parse
+
+    print(f"{'payload':>16} | {'bytes':>5} | " + ' | '.join(f"{name + ' us':>11}" for name in backends) +
+          ' | speedup')
+    totals = dict.fromkeys(backends, 0.0)
+    for name, payload in corpus.items():
+        body = json.dumps(payload).encode()
+        assert views.parse_update(body, bot).model_dump() == legacy_parse(body, bot).model_dump()
+        times = {backend: measure(fn, body, bot, args.runs) for backend, fn in backends.items()}
+        for backend, value in times.items():
+            totals[backend] += value
+        best = min(value for backend, value in times.items() if backend != 'legacy')
+        print(f"{name[:16]:>16} | {len(body):>5} | " + ' | '.join(f"{value:>11.1f}" for value in times.values()) +
+              f" | {times['legacy'] / best:>6.2f}x")
+    best = min(value for backend, value in totals.items() if backend != 'legacy')
+    print(f"{'total':>16} | {'':>5} | " + ' | '.join(f"{value:>11.1f}" for value in totals.values()) +
+          f" | {totals['legacy'] / best:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
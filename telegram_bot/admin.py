@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Product, Engagement, Order, PostSchedule, ChannelPost
+from .models import User, Product, Engagement, Order, PostSchedule, ChannelPost, MediaFile
 
 
 @admin.register(User)
@@ -40,3 +40,9 @@ class ChannelPostAdmin(admin.ModelAdmin):
     list_display = ['id', 'product', 'channel_username', 'message_id', 'posted_at']
     list_filter = ['channel_username']
 
+
+
+@admin.register(MediaFile)
+class MediaFileAdmin(admin.ModelAdmin):
+    list_display = ['id', 'path', 'content_hash', 'file_id', 'updated_at']
+    search_fields = ['path', 'content_hash']
@@ -6,3 +6,5 @@ class TelegramBotConfig(AppConfig):
     name = 'telegram_bot'
     verbose_name = 'Telegram Bot'
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,123 @@
+"""
+ASGI lifespan hooks
+Create the webhook bot (and its pooled HTTP session) and the scheduler on the
+worker's long-lived event loop at startup, and tear them down at shutdown
+"""
+import asyncio
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from config import app_config
+from database.counters import counter_buffer
+from utils.edit_coalescer import keyboard_edits
+from utils.image_pool import image_pool
+from utils.logger import logger
+from utils.update_queue import update_queue
+
+from telegram_bot import views
+
+# Held open by the worker elected to run the scheduler
+_scheduler_lock = None
+_scheduler_started = False
+
+
+def _elect_scheduler() -> bool:
+    """
+    True for the one worker on this host that should run the scheduler.
+
+    The first worker to take an exclusive lock on a file in the media
+    directory wins and keeps it until it exits; if it dies, its
+    replacement takes the lock over. Without fcntl every worker runs it
+    (schedule leases still prevent double posts).
+    """
+    global _scheduler_lock
+    if fcntl is None:
+        return True
+    lock_file = open(os.path.join(app_config.MEDIA_DIR, '.scheduler.lock'), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _scheduler_lock = lock_file
+    return True
+
+
+async def startup():
+    """Build the bot and dispatcher once for this worker"""
+    global _scheduler_started
+    bot_instance, dp_instance = await views.init_bot()
+    keyboard_edits.register_loop()
+
+    # Queued updates run as tasks on this loop, through this worker's bot
+    if app_config.WEBHOOK_QUEUE:
+        update_queue.start_on_loop(bot_instance, dp_instance)
+
+    # One worker runs the scheduler: each process has its own outbound
+    # limiter, so a scheduler per worker would multiply the posting rate
+    if app_config.WEBHOOK_RUN_SCHEDULER and _elect_scheduler():
+        from features.scheduler import start_scheduler
+        try:
+            start_scheduler(bot_instance)
+            _scheduler_started = True
+            logger.info(f"✅ Scheduler running in worker {os.getpid()}")
+        except Exception as e:
+            logger.error(f"⚠️ Failed to start scheduler: {e}")
+
+    logger.info("✅ ASGI worker started")
+
+
+async def shutdown():
+    """Stop background work and close the bot session"""
+    global _scheduler_lock, _scheduler_started
+    if _scheduler_started:
+        from features.scheduler import stop_scheduler
+        try:
+            stop_scheduler()
+        except Exception as e:
+            logger.error(f"⚠️ Error stopping scheduler: {e}")
+        _scheduler_started = False
+    if _scheduler_lock is not None:
+        _scheduler_lock.close()
+        _scheduler_lock = None
+
+    # Drain queued updates, then flush the counters they may have bumped
+    try:
+        await update_queue.aclose()
+    except Exception as e:
+        logger.error(f"⚠️ Error stopping webhook update queue: {e}")
+
+    try:
+        await asyncio.to_thread(counter_buffer.stop)
+    except Exception as e:
+        logger.error(f"⚠️ Error flushing engagement counters: {e}")
+
+    try:
+        await asyncio.to_thread(image_pool.shutdown)
+    except Exception as e:
+        logger.error(f"⚠️ Error stopping image pool: {e}")
+
+    await views._cleanup_bot()
+    logger.info("✅ ASGI worker stopped")
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan protocol handler"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await startup()
+            except Exception as e:
+                logger.error(f"❌ ASGI startup failed: {e}", exc_info=True)
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
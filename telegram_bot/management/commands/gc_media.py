@@ -0,0 +1,137 @@
+"""
+Django management command to garbage-collect unreferenced product images
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from telegram_bot.models import MediaFile, Product
+from utils.logger import logger
+from utils.media_store import SHARDS, media_paths, media_store
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class Command(BaseCommand):
+    help = 'Delete media blobs no product references (a few shards per run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=16,
+            help='Top-level shards (of 256) to scan this run, resuming where the last run stopped',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Scan every shard in one run',
+        )
+        parser.add_argument(
+            '--legacy',
+            action='store_true',
+            help='Also collect pre-store files in the flat media directory',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=48,
+            help='Hours a file must be untouched before it can be deleted (protects uploads in progress)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=1000,
+            help='Maximum files to delete this run (0 = no limit)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting',
+        )
+
+    def handle(self, *args, **options):
+        referenced = self._referenced()
+        cutoff = time.time() - options['min_age'] * 3600
+        limit = options['limit']
+        dry_run = options['dry_run']
+
+        cursor_path = os.path.join(media_store.root, '.gc_cursor')
+        start = self._read_cursor(cursor_path)
+        count = len(SHARDS) if options['all'] else max(1, min(options['shards'], len(SHARDS)))
+        shards = [SHARDS[(start + i) % len(SHARDS)] for i in range(count)]
+
+        candidates = (path for shard in shards for path in media_store.iter_shard(shard))
+        scanned, deleted, freed = self._collect(candidates, referenced, cutoff, limit, dry_run)
+        if options['legacy']:
+            remaining = limit - len(deleted) if limit else 0
+            if not limit or remaining > 0:
+                more = self._collect(media_store.iter_legacy(), referenced, cutoff, remaining, dry_run)
+                scanned += more[0]
+                deleted += more[1]
+                freed += more[2]
+
+        if not dry_run:
+            if deleted:
+                MediaFile.objects.filter(path__in=deleted).delete()
+            media_store.sweep_tmp(options['min_age'] * 3600)
+            if not limit or len(deleted) < limit:
+                # Only move on once these shards were fully scanned
+                self._write_cursor(cursor_path, (start + count) % len(SHARDS))
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Scanned {scanned} files in shards {shards[0]}..{shards[-1]}: "
+            f"{verb} {len(deleted)} ({freed / 1e6:.1f} MB), {len(referenced)} paths referenced"
+        ))
+        logger.info(f"gc_media: {verb.lower()} {len(deleted)} of {scanned} scanned files")
+
+    def _referenced(self) -> set[str]:
+        """Normalized paths referenced by any product"""
+        referenced = set()
+        rows = Product.objects.values_list(
+            'image_path', 'original_image_path', 'image_variants', 'category_fields'
+        ).iterator(chunk_size=2000)
+        for row in rows:
+            referenced.update(_key(path) for path in media_paths(*row))
+        return referenced
+
+    def _collect(self, paths, referenced: set[str], cutoff: float, limit: int, dry_run: bool):
+        scanned = 0
+        deleted = []
+        freed = 0
+        for path in paths:
+            scanned += 1
+            if _key(path) in referenced:
+                continue
+            try:
+                if dry_run:
+                    stat = os.stat(path)
+                    size = stat.st_size if stat.st_mtime < cutoff else None
+                else:
+                    size = media_store.remove_if_stale(path, cutoff)
+            except OSError as e:
+                logger.error(f"gc_media: could not remove {path}: {e}")
+                continue
+            if size is None:
+                continue
+            deleted.append(path)
+            freed += size
+            if limit and len(deleted) >= limit:
+                break
+        return scanned, deleted, freed
+
+    def _read_cursor(self, cursor_path: str) -> int:
+        try:
+            with open(cursor_path) as f:
+                return int(f.read().strip()) % len(SHARDS)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_cursor(self, cursor_path: str, position: int) -> None:
+        os.makedirs(media_store.root, exist_ok=True)
+        with open(cursor_path, 'w') as f:
+            f.write(str(position))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0002_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_public', True)), fields=['-created_at', '-id'], name='products_public_feed_idx'),
+        ),
+    ]
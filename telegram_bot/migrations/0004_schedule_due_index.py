@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0003_product_public_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='postschedule',
+            index=models.Index(fields=['is_active', 'next_post_at'], name='schedules_due_idx'),
+        ),
+    ]
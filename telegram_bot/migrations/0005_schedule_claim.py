@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0004_schedule_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postschedule',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='postschedule',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0005_schedule_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('file_id', models.CharField(max_length=255)),
+                ('file_unique_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'media_files',
+                'ordering': ['-created_at'],
+                'unique_together': {('path', 'content_hash')},
+            },
+        ),
+    ]
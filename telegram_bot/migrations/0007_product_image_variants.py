@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0006_media_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, null=True),
+        ),
+    ]
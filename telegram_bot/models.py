@@ -2,6 +2,9 @@
 Django models for Telegram Bot
 Converted from SQLAlchemy models
 """
+import time
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -84,6 +87,8 @@ class Product(models.Model):
     # Image storage
     image_path = models.CharField(max_length=500)  # Path to watermarked image
     original_image_path = models.CharField(max_length=500, null=True, blank=True)  # Original without watermark
+    # Watermarked derivatives of the main image: {"full": path, "preview": path}
+    image_variants = PassthroughJSONField(null=True, blank=True, default=dict)
     
     # Visibility and status
     is_active = models.BooleanField(default=True)
@@ -104,6 +109,10 @@ class Product(models.Model):
     save_enabled = models.BooleanField(default=True)
     order_enabled = models.BooleanField(default=True)
     
+    # Full-text search document (title A, description B); maintained by
+    # telegram_bot.signals and indexed with GIN on PostgreSQL
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -111,9 +120,34 @@ class Product(models.Model):
     def __str__(self):
         return f"Product {self.id}: {self.title} - {self.price} birr"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the write-behind counters tell snapshots older than a flush
+        # from fresh ones (database.counters)
+        instance.loaded_at = time.monotonic()
+        return instance
+    
+    def image_for(self, variant: str) -> tuple[str, ...]:
+        """
+        Candidate paths for an image derivative ("preview", "full"): the
+        derivative, then image_path. utils.media_registry sends the first
+        that exists, so no filesystem access happens here.
+        """
+        path = (self.image_variants or {}).get(variant)
+        return (path, self.image_path) if path else (self.image_path,)
+    
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the public feed: (created_at, id) cursor
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='products_public_feed_idx',
+                condition=models.Q(is_public=True, is_active=True),
+            ),
+        ]
 
 
 class Engagement(models.Model):
@@ -187,6 +221,10 @@ class PostSchedule(models.Model):
     last_posted_at = models.DateTimeField(null=True, blank=True)
     next_post_at = models.DateTimeField(null=True, blank=True)
     
+    # Posting lease: the worker holding an unexpired claim owns the next post
+    claimed_by = models.CharField(max_length=64, null=True, blank=True)
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -197,6 +235,10 @@ class PostSchedule(models.Model):
     class Meta:
         db_table = 'schedules'
         ordering = ['-created_at']
+        indexes = [
+            # Due-schedule lookup: is_active AND next_post_at <= now
+            models.Index(fields=['is_active', 'next_post_at'], name='schedules_due_idx'),
+        ]
 
 
 class ChannelPost(models.Model):
@@ -213,3 +255,35 @@ class ChannelPost(models.Model):
         db_table = 'channel_posts'
         ordering = ['-posted_at']
 
+
+
+class MediaFile(models.Model):
+    """Telegram file_id of an uploaded image, so later sends reuse it instead of re-uploading"""
+    path = models.CharField(max_length=500)
+    content_hash = models.CharField(max_length=64)  # SHA-256 of the file bytes
+    file_id = models.CharField(max_length=255)
+    file_unique_id = models.CharField(max_length=255, null=True, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"MediaFile {self.path} ({self.content_hash[:12]})"
+    
+    class Meta:
+        db_table = 'media_files'
+        unique_together = ['path', 'content_hash']
+        ordering = ['-created_at']
+
+
+class ProcessedUpdate(models.Model):
+    """Telegram update_id claimed by a worker, so redeliveries to other workers are dropped"""
+    update_id = models.BigIntegerField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"ProcessedUpdate {self.update_id}"
+    
+    class Meta:
+        db_table = 'processed_updates'
@@ -0,0 +1,73 @@
+"""
+Model signal handlers for Telegram Bot
+Keeps derived data (search index, inline result and carousel caches, due-time
+heap, per-update identity map) in sync with user, product and schedule changes
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from database import identity_map, search
+from telegram_bot.models import PostSchedule, Product, User
+from utils.carousel_cache import carousel_cache
+from utils.due_scheduler import due_scheduler
+from utils.inline_cache import inline_cache
+
+# Changes that can make a product newly appear in inline results
+VISIBILITY_FIELDS = search.SEARCH_FIELDS | {'is_active', 'is_public'}
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search(sender, instance, update_fields=None, **kwargs):
+    """Reindex the product when its searchable text may have changed"""
+    if update_fields is not None and not search.SEARCH_FIELDS & set(update_fields):
+        return
+    search.refresh_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def forget_product_search(sender, instance, **kwargs):
+    """Drop a deleted product from the search index"""
+    search.forget_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_inline_results(sender, instance, created=False, update_fields=None, **kwargs):
+    """Drop cached inline pages showing the product or whose query now matches it"""
+    if created or update_fields is None or VISIBILITY_FIELDS & set(update_fields):
+        inline_cache.invalidate_product(instance.pk, instance.title, instance.description)
+    else:
+        inline_cache.invalidate_product(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def forget_inline_results(sender, instance, **kwargs):
+    """Drop cached inline pages showing a deleted product"""
+    inline_cache.invalidate_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_carousel(sender, instance, **kwargs):
+    """Drop a changed or deleted product from its seller's carousel cache"""
+    carousel_cache.invalidate(instance.seller_id, instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def evict_identity(sender, instance, **kwargs):
+    """Make later reads in the same update see the write"""
+    identity_map.forget(sender, instance.pk)
+
+
+@receiver(post_save, sender=PostSchedule)
+def reschedule_post(sender, instance, **kwargs):
+    """Wake the due-time scheduler when a schedule is created or moved"""
+    due_scheduler.notify(instance.pk, instance.next_post_at if instance.is_active else None)
+
+
+@receiver(post_delete, sender=PostSchedule)
+def unschedule_post(sender, instance, **kwargs):
+    """Drop a deleted schedule from the due-time heap"""
+    due_scheduler.notify(instance.pk, None)
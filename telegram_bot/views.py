@@ -4,12 +4,25 @@ Django views for Telegram Bot webhook
 import json
 import asyncio
 import importlib
+import threading
 from contextlib import suppress
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from aiogram.types import Update
+from pydantic import ValidationError
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.conf import settings
+from config import app_config
+from database.identity_map import install_identity_map
 from utils.logger import logger
+from utils.outbound import install_outbound_limiter
+from utils.query_budget import install_query_budget
+from utils.update_dedup import install_update_dedup
+from utils.update_queue import update_queue
 
 # Global bot and dispatcher instances (singletons for the process)
 bot = None
@@ -28,25 +41,43 @@ async def _safe_feed_update(bot_instance, dp_instance, update):
         # Re-raise non-loop errors so they are logged as usual
         raise
 
+# Router modules are imported on first use, not when this module loads
 ROUTER_MODULES = [
     "features.onboarding",
     "features.products",
     "features.inline_search",
     "features.engagement",
     "features.scheduler",
+    "features.admin",
 ]
 
+# One dispatcher per process (routers can only be attached once)
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def iter_routers():
+    """Import each feature module (once) and yield its router."""
+    for module_path in ROUTER_MODULES:
+        yield importlib.import_module(module_path).router
+
 
 def build_dispatcher():
+    """Return the process-wide dispatcher, building it on first call."""
+    global _dispatcher
     from aiogram import Dispatcher
 
-    dispatcher = Dispatcher()
-    for module_path in ROUTER_MODULES:
-        module = importlib.import_module(module_path)
-        module = importlib.reload(module)
-        dispatcher.include_router(module.router)
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            dispatcher = Dispatcher()
+            for router in iter_routers():
+                dispatcher.include_router(router)
+            install_update_dedup(dispatcher)
+            install_query_budget(dispatcher)
+            install_identity_map(dispatcher)
+            _dispatcher = dispatcher
 
-    return dispatcher
+    return _dispatcher
 
 
 async def _cleanup_bot():
@@ -61,37 +92,72 @@ async def _cleanup_bot():
         finally:
             bot = None
 
-async def init_bot():
-    """Initialize bot and dispatcher once and reuse them across webhook requests."""
-    global bot, dp
-
-    # If we've already created the bot/dispatcher in this process, just reuse them.
-    if bot is not None and dp is not None:
-        return bot, dp
-
-    # Clean up any previous session (helps during Django reloads)
-    await _cleanup_bot()
-
+async def _create_bot():
+    """Create a bot and dispatcher bound to the running event loop."""
     try:
-        from aiogram import Bot as AiogramBot, Dispatcher
+        from aiogram import Bot as AiogramBot
+        from aiogram.client.session.aiohttp import AiohttpSession
         from aiogram.client.default import DefaultBotProperties
         from aiogram.enums import ParseMode
     except ImportError:  # pragma: no cover
         logger.error("aiogram not installed. Please install it: pip install aiogram>=3.0.0")
         raise
 
-    bot = AiogramBot(
+    # One pooled HTTP session per bot, reused for every outgoing call
+    bot_instance = AiogramBot(
         token=settings.BOT_TOKEN,
+        session=AiohttpSession(limit=app_config.BOT_SESSION_POOL_SIZE),
         default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
     )
+    install_outbound_limiter(bot_instance)
+
+    return bot_instance, build_dispatcher()
 
-    dp = build_dispatcher()
+
+async def init_bot():
+    """Initialize bot and dispatcher once and reuse them across webhook requests."""
+    global bot, dp
+
+    # If we've already created the bot/dispatcher in this process, just reuse them.
+    if bot is not None and dp is not None:
+        return bot, dp
+
+    # Clean up any previous session (helps during Django reloads)
+    await _cleanup_bot()
+
+    bot, dp = await _create_bot()
 
     logger.info("✅ Bot and dispatcher initialized for webhook")
 
     return bot, dp
 
 
+def parse_update(body: bytes, bot_instance=None) -> Update:
+    """
+    Validate a webhook body straight into an Update, mounted on the bot.
+
+    pydantic parses the raw bytes itself (no intermediate dict), and passing
+    the bot as context spares feed_update its dump/re-validate remount.
+    """
+    context = {"bot": bot_instance} if bot_instance is not None else None
+    if orjson is not None and app_config.WEBHOOK_JSON_BACKEND == "orjson":
+        return Update.model_validate(orjson.loads(body), context=context)
+    return Update.model_validate_json(body, context=context)
+
+
+async def _enqueue_update(body: bytes):
+    """Hand an update to the worker queue; 503 tells Telegram to retry later."""
+    if not update_queue.running:
+        # No ASGI lifespan started it (WSGI): the workers get their own
+        # thread, with a bot and dispatcher created on that thread's loop
+        await asyncio.to_thread(update_queue.start, _create_bot)
+    update = parse_update(body, update_queue.bot)
+    if not update_queue.submit(update):
+        logger.warning(f"Webhook queue full, deferring update {update.update_id}")
+        return JsonResponse({"ok": False, "error": "Queue full"}, status=503)
+    return JsonResponse({"ok": True})
+
+
 @csrf_exempt
 @require_POST
 async def telegram_webhook(request):
@@ -99,23 +165,15 @@ async def telegram_webhook(request):
     Handle Telegram webhook updates (async view)
     """
     try:
+        # request.body is a property (bytes), not a method, so no await or parentheses
+        if app_config.WEBHOOK_QUEUE:
+            return await _enqueue_update(request.body)
+
         # Initialize bot if not already done
         bot_instance, dp_instance = await init_bot()
-        
-        # Parse update from request body
-        # request.body is a property (bytes), not a method, so no await or parentheses
-        body = request.body
-        # json.loads can handle bytes directly in Python 3.6+
-        update_dict = json.loads(body)
-        from aiogram.types import Update
-        
-        # Use model_validate for aiogram 3.x (Pydantic v2)
-        try:
-            update = Update.model_validate(update_dict)
-        except AttributeError:
-            # Fallback for older aiogram versions
-            update = Update(**update_dict)
-        
+
+        update = parse_update(request.body, bot_instance)
+
         # Process update asynchronously (safe against closed-loop errors)
         try:
             await _safe_feed_update(bot_instance, dp_instance, update)
@@ -124,9 +182,9 @@ async def telegram_webhook(request):
         
         return JsonResponse({"ok": True})
         
-    except json.JSONDecodeError:
-        logger.error("Invalid JSON in webhook request")
-        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
+    except (json.JSONDecodeError, ValidationError):
+        logger.error("Invalid update payload in webhook request")
+        return JsonResponse({"ok": False, "error": "Invalid update"}, status=400)
     except Exception as e:
         logger.error(f"Error in webhook handler: {e}", exc_info=True)
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
@@ -0,0 +1,99 @@
+"""
+Carousel product cache
+Keeps the few products around each user's current /myproducts position in
+memory, so Next/Prev taps are served without a database round trip
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from config import app_config
+
+
+class CarouselCache:
+    """
+    Per-user LRU of prefetched products with a TTL.
+
+    Only a window of ``2 * prefetch + 1`` products is kept per user; older
+    entries are dropped as the user moves on. Product saves and deletes
+    invalidate entries through telegram_bot.signals; counter flushes (which
+    bypass signals) invalidate through database.counters.
+    """
+
+    def __init__(self, max_users: int, ttl_seconds: float, prefetch: int):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.prefetch = prefetch
+        self._users: OrderedDict[int, dict[int, tuple[object, float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def window(self, product_ids: list[int], index: int) -> list[int]:
+        """IDs of the product at ``index`` and its prefetch neighbours"""
+        return product_ids[max(0, index - self.prefetch): index + self.prefetch + 1]
+
+    def get_many(self, user_id: int, product_ids: Iterable[int]) -> dict:
+        """Fresh cached products among ``product_ids``"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is not None:
+                self._users.move_to_end(user_id)
+            for product_id in product_ids:
+                entry = entries.get(product_id) if entries else None
+                if entry is not None and entry[1] > now:
+                    found[product_id] = entry[0]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, user_id: int, products: Iterable, keep: Iterable[int]) -> None:
+        """Store products and drop the user's entries outside ``keep``"""
+        expires_at = time.monotonic() + self.ttl_seconds
+        keep = set(keep)
+        with self._lock:
+            entries = self._users.setdefault(user_id, {})
+            self._users.move_to_end(user_id)
+            for product in products:
+                entries[product.id] = (product, expires_at)
+            for product_id in [pid for pid in entries if pid not in keep]:
+                del entries[product_id]
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int, product_id: int) -> None:
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries:
+                entries.pop(product_id, None)
+
+    def invalidate_products(self, product_ids: Iterable[int]) -> None:
+        """Drop products from every user's entries (the owner is not known)"""
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        with self._lock:
+            for entries in self._users.values():
+                for product_id in product_ids & entries.keys():
+                    del entries[product_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'products': sum(len(entries) for entries in self._users.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Shared by the /myproducts carousel handlers
+carousel_cache = CarouselCache(
+    max_users=app_config.CAROUSEL_CACHE_USERS,
+    ttl_seconds=app_config.CAROUSEL_CACHE_TTL,
+    prefetch=app_config.CAROUSEL_PREFETCH,
+)
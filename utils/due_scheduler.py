@@ -0,0 +1,193 @@
+"""
+Due-time scheduler
+Keeps a min-heap of schedule due times and sleeps exactly until the next
+one, waking early when schedules are created, moved or removed
+"""
+import asyncio
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable, Optional
+
+from config import app_config
+from utils.logger import logger
+
+# (schedule_id, next_post_at) rows; next_post_at None means "not scheduled"
+DueRows = Iterable[tuple[int, Optional[datetime]]]
+Loader = Callable[[Optional[list[int]]], Awaitable[DueRows]]
+# Rows for schedules changed since a time (inactive ones with due None)
+ChangePoller = Callable[[datetime], Awaitable[DueRows]]
+# Posts due schedules; returns the ids it actually claimed and attempted
+DueHandler = Callable[[list[int]], Awaitable[Iterable[int]]]
+
+
+class DueTimeScheduler:
+    """
+    In-memory min-heap of (due timestamp, schedule id).
+
+    Superseded heap entries are dropped lazily: ``_due`` holds the current
+    timestamp per id, and popped entries that don't match it are ignored.
+    After a batch fires, the fired and attempted ids are re-read from the
+    database so posted, failed and foreign-worker schedules all land at
+    their real next time. Anything still overdue that this process attempted
+    (it failed) is retried after ``retry_delay``; anything it never got to
+    attempt (leased by another worker, or a run was already in progress) is
+    re-checked after the shorter ``recheck_delay``.
+
+    ``notify`` only reaches the scheduler in its own process. Schedules
+    saved by other processes (the other ASGI workers, when only one runs
+    the scheduler) are picked up by polling for rows changed since the last
+    poll every ``poll_interval`` seconds, and by a slow full resync.
+    """
+
+    # Overlap between polls, so a row saved while a poll runs is not missed
+    POLL_OVERLAP = 5
+
+    def __init__(self, resync_interval: float, retry_delay: float, recheck_delay: float = 30,
+                 poll_interval: float = 0):
+        self.resync_interval = resync_interval
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.recheck_delay = min(recheck_delay, retry_delay)
+        self._heap: list[tuple[float, int]] = []
+        self._due: dict[int, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, load: Loader, on_due: DueHandler, poll: Optional[ChangePoller] = None) -> None:
+        """Start the engine on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run(load, on_due, poll))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self._task = None
+        self._loop = None
+
+    def notify(self, schedule_id: int, due: Optional[datetime]) -> None:
+        """Record a new due time (None removes it); safe to call from any thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._set(schedule_id, due)
+        else:
+            loop.call_soon_threadsafe(self._set, schedule_id, due)
+
+    def _set(self, schedule_id: int, due: Optional[datetime]) -> None:
+        if due is None:
+            self._due.pop(schedule_id, None)
+        else:
+            timestamp = due.timestamp()
+            self._due[schedule_id] = timestamp
+            heapq.heappush(self._heap, (timestamp, schedule_id))
+        self._compact()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _replace_all(self, rows: DueRows) -> None:
+        self._due = {sid: due.timestamp() for sid, due in rows if due is not None}
+        self._heap = [(ts, sid) for sid, ts in self._due.items()]
+        heapq.heapify(self._heap)
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(ts, sid) for sid, ts in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> list[int]:
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            timestamp, schedule_id = heapq.heappop(self._heap)
+            if self._due.get(schedule_id) == timestamp:
+                del self._due[schedule_id]
+                ready.append(schedule_id)
+        return ready
+
+    def _next_wakeup(self) -> float:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else math.inf
+
+    def _defer(self, schedule_id: int, timestamp: float) -> None:
+        self._due[schedule_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, schedule_id))
+
+    async def _run(self, load: Loader, on_due: DueHandler, poll: Optional[ChangePoller]) -> None:
+        # The first load happens inside the guarded loop, so a database that
+        # is down at startup is retried instead of killing the task
+        loaded = False
+        next_resync = time.monotonic()
+        polling = poll is not None and self.poll_interval > 0
+        next_poll = math.inf
+        polled_at = None
+
+        while True:
+            try:
+                if time.monotonic() >= next_resync:
+                    started = datetime.now(timezone.utc)
+                    self._replace_all(await load(None))
+                    next_resync = time.monotonic() + self.resync_interval
+                    if polling:
+                        polled_at = started
+                        next_poll = time.monotonic() + self.poll_interval
+                    if not loaded:
+                        loaded = True
+                        logger.info(f"Due-time scheduler started with {len(self._due)} schedules")
+                elif time.monotonic() >= next_poll:
+                    started = datetime.now(timezone.utc)
+                    for schedule_id, due in await poll(polled_at - timedelta(seconds=self.POLL_OVERLAP)):
+                        if self._due.get(schedule_id) != (due.timestamp() if due else None):
+                            self._set(schedule_id, due)
+                    polled_at = started
+                    next_poll = time.monotonic() + self.poll_interval
+
+                ready = self._pop_due(time.time())
+                if ready:
+                    attempted = set(await on_due(ready) or ())
+                    now = time.time()
+                    for schedule_id, due in await load(list(attempted.union(ready))):
+                        if due is None or due.timestamp() > now:
+                            self._set(schedule_id, due)
+                        elif schedule_id in attempted:
+                            # Claimed here and still overdue: the post failed
+                            self._defer(schedule_id, now + self.retry_delay)
+                        else:
+                            # Leased by another worker or not reached yet
+                            self._defer(schedule_id, now + self.recheck_delay)
+                    continue
+
+                timeout = min(
+                    self._next_wakeup() - time.time(),
+                    next_resync - time.monotonic(),
+                    next_poll - time.monotonic()
+                )
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in due-time scheduler: {e}")
+                await asyncio.sleep(self.retry_delay)
+
+
+# Process-wide engine; started by features.scheduler.start_scheduler
+due_scheduler = DueTimeScheduler(
+    resync_interval=app_config.SCHEDULER_RESYNC_INTERVAL,
+    retry_delay=app_config.SCHEDULER_RETRY_DELAY,
+    poll_interval=app_config.SCHEDULER_POLL_INTERVAL,
+)
@@ -0,0 +1,171 @@
+"""
+Keyboard edit coalescer
+Collapses bursts of counter updates on one message into at most one
+edit_reply_markup per window, always rendering the latest counts
+"""
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
+
+from config import app_config
+from utils.logger import logger
+
+MessageKey = Union[tuple[int, int], str]
+MarkupBuilder = Callable[[], InlineKeyboardMarkup]
+
+
+@dataclass
+class _MessageState:
+    """Edit bookkeeping for one message"""
+    bot: Bot
+    chat_id: Optional[int] = None
+    message_id: Optional[int] = None
+    inline_message_id: Optional[str] = None
+    builder: Optional[MarkupBuilder] = None
+    last_sent: Optional[str] = None
+    next_allowed: float = 0.0
+    paused_until: float = 0.0
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class EditCoalescer:
+    """
+    Per-message debouncer for edit_reply_markup.
+
+    The first change is sent right away; changes arriving within the window
+    only replace the pending builder, which is called when the window opens
+    so the edit reflects the newest counts. Markup identical to what the
+    message already shows is never re-sent, and TelegramRetryAfter pushes the
+    next attempt out by the requested delay.
+
+    Delayed edits run as tasks, so they need an event loop that outlives the
+    update: polling, ASGI workers and the webhook update queue register
+    theirs with ``register_loop``. On any other loop (a WSGI request's
+    throwaway loop) the edit is sent immediately instead.
+    """
+
+    def __init__(self, window: float, max_tracked: int = 10000):
+        self.window = window
+        self.max_tracked = max_tracked
+        self._states: OrderedDict[MessageKey, _MessageState] = OrderedDict()
+        self.sent = 0
+        self.coalesced = 0
+        self.skipped_unchanged = 0
+        self.retry_after_hits = 0
+        self.immediate = 0
+        self._loops: weakref.WeakSet = weakref.WeakSet()
+
+    def register_loop(self) -> None:
+        """Mark the running loop as long-lived, so edits may be delayed on it"""
+        self._loops.add(asyncio.get_running_loop())
+
+    async def submit(self, callback: CallbackQuery, builder: MarkupBuilder) -> None:
+        """Queue a keyboard refresh for the message the callback came from"""
+        if callback.inline_message_id:
+            key: MessageKey = callback.inline_message_id
+            target = {'inline_message_id': callback.inline_message_id}
+        elif callback.message:
+            key = (callback.message.chat.id, callback.message.message_id)
+            target = {'chat_id': callback.message.chat.id, 'message_id': callback.message.message_id}
+        else:
+            return
+
+        state = self._states.get(key)
+        if state is None:
+            state = _MessageState(bot=callback.bot, **target)
+            self._states[key] = state
+            self._evict()
+        self._states.move_to_end(key)
+
+        if asyncio.get_running_loop() not in self._loops:
+            # A task scheduled here could die with the loop: edit now
+            self.immediate += 1
+            state.builder = builder
+            await self._drain(key, state, wait=False)
+            return
+
+        if state.builder is not None:
+            self.coalesced += 1
+        state.builder = builder
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._drain(key, state))
+
+    async def _drain(self, key: MessageKey, state: _MessageState, wait: bool = True) -> None:
+        while state.builder is not None:
+            if not wait:
+                # No long-lived loop to come back on: skip the window, but
+                # drop the edit during a retry-after pause (a later click
+                # carries the newer counts)
+                if time.monotonic() < state.paused_until:
+                    state.builder = None
+                    return
+            else:
+                delay = state.next_allowed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            builder, state.builder = state.builder, None
+            try:
+                markup = builder()
+            except Exception as e:
+                logger.error(f"Error building keyboard for {key}: {e}")
+                continue
+
+            rendered = markup.model_dump_json(exclude_none=True)
+            if rendered == state.last_sent:
+                self.skipped_unchanged += 1
+                continue
+
+            try:
+                await state.bot.edit_message_reply_markup(
+                    chat_id=state.chat_id,
+                    message_id=state.message_id,
+                    inline_message_id=state.inline_message_id,
+                    reply_markup=markup
+                )
+                state.last_sent = rendered
+                self.sent += 1
+                state.next_allowed = time.monotonic() + self.window
+            except TelegramRetryAfter as e:
+                self.retry_after_hits += 1
+                state.next_allowed = state.paused_until = time.monotonic() + e.retry_after
+                if state.builder is None:
+                    state.builder = builder
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    state.last_sent = rendered
+                else:
+                    # Message deleted or too old to edit
+                    logger.debug(f"Dropping keyboard edit for {key}: {e}")
+                state.next_allowed = time.monotonic() + self.window
+            except Exception as e:
+                logger.error(f"Error editing keyboard for {key}: {e}")
+                state.next_allowed = time.monotonic() + self.window
+
+    def _evict(self) -> None:
+        while len(self._states) > self.max_tracked:
+            key, state = next(iter(self._states.items()))
+            if state.task is not None and not state.task.done():
+                break
+            del self._states[key]
+
+    def stats(self) -> dict:
+        return {
+            'tracked_messages': len(self._states),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'skipped_unchanged': self.skipped_unchanged,
+            'retry_after_hits': self.retry_after_hits,
+            'immediate': self.immediate,
+        }
+
+
+# Shared by the like/save handlers
+keyboard_edits = EditCoalescer(window=app_config.KEYBOARD_EDIT_WINDOW)
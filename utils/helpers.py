@@ -4,6 +4,7 @@ Common functions used across features
 """
 from datetime import datetime, timedelta
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from django.utils import timezone
 from typing import Optional
 
 def format_price(price: float) -> str:
@@ -242,9 +243,9 @@ def calculate_next_post_time(interval_days: int, post_time_str: str) -> datetime
         post_time_str: Time in HH:MM format
     
     Returns:
-        Next post datetime
+        Next post datetime (timezone-aware, in the project time zone)
     """
-    now = datetime.now()
+    now = timezone.localtime()
     
     # Parse time
     try:
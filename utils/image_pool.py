@@ -0,0 +1,137 @@
+"""
+Image worker pool
+Runs CPU-heavy Pillow work (decode, composite, encode) off the event loop
+in a bounded thread or process pool
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+from config import app_config
+from utils.logger import logger
+
+T = TypeVar('T')
+
+
+class ImagePool:
+    """
+    Bounded executor for image jobs.
+
+    At most ``workers + max_queue`` jobs are admitted at once; further
+    callers wait (without blocking the loop) until a slot frees up. Waiting
+    is done by polling, like the outbound limiter, so the pool works under
+    any event loop, including the per-request loops of webhook mode.
+    Thread mode is the default: Pillow releases the GIL while decoding,
+    resampling and encoding. Process mode needs picklable, module-level
+    job functions.
+    """
+
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind if kind in ('thread', 'process') else 'thread'
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self.waiting = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_wait = 0.0
+        self.busy_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='image-worker'
+                    )
+            return self._executor
+
+    def _try_admit(self) -> bool:
+        with self._lock:
+            if self._admitted >= self.capacity:
+                return False
+            self._admitted += 1
+            return True
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Run ``fn(*args)`` in the pool and return its result"""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            while not self._try_admit():
+                await asyncio.sleep(self.POLL_INTERVAL)
+        finally:
+            self.waiting -= 1
+        self.max_wait = max(self.max_wait, time.monotonic() - started)
+
+        self.submitted += 1
+        begun = time.monotonic()
+        try:
+            future = self._get_executor().submit(fn, *args)
+            result = await asyncio.wrap_future(future)
+            self.completed += 1
+            return result
+        except BrokenProcessPool:
+            self.failed += 1
+            self._reset()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.busy_seconds += time.monotonic() - begun
+            with self._lock:
+                self._admitted -= 1
+
+    def _reset(self) -> None:
+        """Drop a broken process pool so the next job starts a fresh one"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            logger.error("Image process pool broke; restarting it")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> dict:
+        """Queue depth and throughput metrics"""
+        with self._lock:
+            admitted = self._admitted
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'in_flight': admitted,
+            'queued': max(0, admitted - self.workers) + self.waiting,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'max_wait_seconds': round(self.max_wait, 3),
+            'busy_seconds': round(self.busy_seconds, 3),
+        }
+
+
+# Shared by the watermarking and thumbnail helpers
+image_pool = ImagePool(
+    kind=app_config.IMAGE_POOL_KIND,
+    workers=app_config.IMAGE_POOL_WORKERS or min(4, os.cpu_count() or 1),
+    max_queue=app_config.IMAGE_POOL_MAX_QUEUE,
+)
@@ -0,0 +1,162 @@
+"""
+Photo ingest pipeline
+Downloads a Telegram photo into memory, decodes it once and writes the
+untouched original plus the watermarked derivatives (full, preview and
+optionally WebP) into the content-addressed media store in a single pass
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+
+from aiogram import Bot
+from PIL import Image
+
+from config import app_config
+from utils.image_pool import image_pool
+from utils.logger import logger
+from utils.media_store import media_store
+from utils.watermark import save_image, stamp_watermark
+
+STAGES = ('download', 'decode', 'watermark', 'encode')
+
+# Derivative names, as stored in Product.image_variants
+FULL = 'full'
+PREVIEW = 'preview'
+
+
+@dataclass
+class IngestedPhoto:
+    """Files written for one uploaded photo"""
+    original_path: str
+    variants: dict[str, str]
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def watermarked_path(self) -> str:
+        return self.variants[FULL]
+
+    @property
+    def preview_path(self) -> str:
+        return self.variants.get(PREVIEW, self.variants[FULL])
+
+
+def _derivative_specs(ext: str) -> dict[str, tuple[str, int, str]]:
+    """Derivative name -> (extension, longest side, forced format)"""
+    return {
+        FULL: (ext, app_config.INGEST_MAX_DIMENSION, None),
+        PREVIEW: (ext, app_config.IMAGE_PREVIEW_DIMENSION, None),
+    }
+
+
+class IngestStats:
+    """Running per-stage totals, for spotting which stage dominates"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.photos = 0
+        self.failures = 0
+        self._totals = {stage: 0.0 for stage in STAGES}
+
+    def record(self, timings: dict[str, float]) -> None:
+        with self._lock:
+            self.photos += 1
+            for stage, seconds in timings.items():
+                self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = max(self.photos, 1)
+            return {
+                'photos': self.photos,
+                'failures': self.failures,
+                'avg_ms': {stage: round(total * 1000 / count, 1) for stage, total in self._totals.items()},
+            }
+
+
+ingest_stats = IngestStats()
+
+
+def _decode(data: bytes, ext: str, store_name: str):
+    """Store the original bytes, then decode once and stamp the watermark (blocking)"""
+    timings = {}
+
+    # The downloaded bytes are the original; no decode/re-encode round trip
+    original_path = media_store.put_bytes(data, ext)
+
+    limit = app_config.INGEST_MAX_DIMENSION
+    started = time.perf_counter()
+    with Image.open(BytesIO(data)) as img:
+        original_format = img.format
+        if img.format == 'JPEG':
+            # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 when the
+            # upload is far larger than we would ever send
+            img.draft('RGB', (limit, limit))
+        img.load()
+        image = img.copy() if img.mode in ('RGB', 'RGBA') else img.convert('RGBA')
+    if max(image.size) > limit:
+        image.thumbnail((limit, limit), Image.Resampling.LANCZOS)
+    timings['decode'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    stamp_watermark(image, store_name)
+    timings['watermark'] = time.perf_counter() - started
+
+    return original_path, image, original_format, timings
+
+
+def _encode(image, ext: str, max_dimension: int, image_format: str) -> str:
+    """Resize (on a copy), encode one derivative and store it (blocking)"""
+    if max(image.size) > max_dimension:
+        image = image.copy()
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    tmp_path = save_image(image, media_store.temp_path(ext), image_format)
+    return media_store.adopt(tmp_path)
+
+
+async def ingest_photo(bot: Bot, file_id: str, store_name: str) -> IngestedPhoto:
+    """
+    Fetch a photo and store the original plus its watermarked derivatives
+
+    If the image cannot be decoded, the original is kept and used as the
+    full derivative too, matching add_watermark's fallback.
+    """
+    started = time.perf_counter()
+    file = await bot.get_file(file_id)
+    ext = os.path.splitext(file.file_path)[1] if file.file_path else ""
+    ext = ext or ".jpg"
+    buffer = BytesIO()
+    await bot.download_file(file.file_path, buffer)
+    timings = {'download': time.perf_counter() - started}
+
+    original_path = None
+    try:
+        original_path, image, original_format, stage_timings = await image_pool.run(
+            _decode, buffer.getvalue(), ext, store_name
+        )
+        timings.update(stage_timings)
+
+        # Derivatives are independent encodes of the same stamped image
+        specs = _derivative_specs(ext)
+        started = time.perf_counter()
+        paths = await asyncio.gather(*(
+            image_pool.run(_encode, image, derivative_ext, max_dimension, image_format or original_format)
+            for derivative_ext, max_dimension, image_format in specs.values()
+        ))
+        timings['encode'] = time.perf_counter() - started
+        variants = dict(zip(specs, paths))
+        ingest_stats.record(timings)
+    except Exception as e:
+        ingest_stats.failures += 1
+        logger.error(f"Error watermarking photo {file_id}: {e}")
+        if original_path is None:
+            original_path = await asyncio.to_thread(media_store.put_bytes, buffer.getvalue(), ext)
+        variants = {FULL: original_path}
+
+    logger.info(
+        f"Ingested {os.path.basename(original_path)}: "
+        + " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in timings.items())
+    )
+    return IngestedPhoto(original_path, variants, timings)
@@ -0,0 +1,141 @@
+"""
+Inline query result cache
+Keeps fully built inline results (captions, articles, keyboards) keyed by
+normalized query + offset, with LRU eviction, TTL expiry and invalidation
+when a product that appears in (or could match) a cached page changes
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import app_config
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse case and whitespace so equivalent queries share an entry"""
+    return ' '.join(query.lower().split())
+
+
+def _tokens(text: Optional[str]) -> list[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+@dataclass
+class CachedPage:
+    """One answered inline page"""
+    results: list
+    product_ids: frozenset
+    next_offset: str
+    expires_at: float
+
+
+class InlineResultCache:
+    """Thread-safe LRU/TTL cache of inline result pages"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[str, str], CachedPage] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, query: str, offset: str = "") -> Optional[CachedPage]:
+        """Return a fresh cached page or None"""
+        key = (query, offset)
+        now = time.monotonic()
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None or page.expires_at <= now:
+                if page is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def set(self, query: str, offset: str, results: list, product_ids, next_offset: str = "") -> None:
+        """Store a built page, evicting the least recently used entries"""
+        page = CachedPage(
+            results=results,
+            product_ids=frozenset(product_ids),
+            next_offset=next_offset,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        with self._lock:
+            self._entries[(query, offset)] = page
+            self._entries.move_to_end((query, offset))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_product(self, product_id: int, title: Optional[str] = None,
+                           description: Optional[str] = None) -> int:
+        """
+        Drop pages affected by a product change.
+
+        Pages that contain the product are always dropped. When the product's
+        text is given (create/edit), pages whose query now matches it and the
+        recent-products feed (empty query) are dropped too.
+
+        Returns:
+            Number of entries removed
+        """
+        product_tokens = None
+        if title is not None or description is not None:
+            product_tokens = set(_tokens(title)) | set(_tokens(description))
+
+        with self._lock:
+            stale = []
+            for key, page in self._entries.items():
+                query = key[0]
+                if product_id in page.product_ids:
+                    stale.append(key)
+                elif product_tokens is not None and (
+                    not query or _query_matches(query, product_tokens)
+                ):
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def _query_matches(query: str, product_tokens: set[str]) -> bool:
+    """Same prefix semantics as the search backend: every query token prefixes a product token"""
+    return all(
+        any(token.startswith(q) for token in product_tokens)
+        for q in _tokens(query)
+    )
+
+
+# Process-wide cache shared by inline handlers and product change hooks
+inline_cache = InlineResultCache(
+    max_entries=app_config.INLINE_CACHE_SIZE,
+    ttl_seconds=app_config.INLINE_CACHE_TTL,
+)
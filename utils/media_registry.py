@@ -0,0 +1,158 @@
+"""
+Telegram media registry
+Sends product images by cached file_id instead of re-uploading the bytes;
+the first upload of each (path, content hash) records the file_id Telegram
+returns, and a rejected file_id falls back to a fresh upload
+"""
+import asyncio
+import hashlib
+import os
+from functools import lru_cache
+from typing import Optional, Sequence, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from database.db import db
+from utils.logger import logger
+
+HASH_CACHE_SIZE = 4096
+
+# A path, or candidate paths in order of preference (e.g. a derivative, then
+# the product's main image); the first file that exists is sent
+ImageSource = Union[str, Sequence[str]]
+
+# Substrings of Bot API errors that mean the file_id itself is unusable;
+# any other bad request (caption, chat, markup) is re-raised as is
+FILE_ID_ERRORS = (
+    'wrong file identifier',
+    'wrong remote file identifier',
+    'file reference expired',
+    'file_reference_expired',
+    'wrong padding',
+    'wrong string length',
+    'file_id',
+)
+
+
+def _is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in FILE_ID_ERRORS)
+
+
+@lru_cache(maxsize=HASH_CACHE_SIZE)
+def _hash_file(path: str, mtime_ns: int, size: int) -> str:
+    """sha256 of a file version; keyed on mtime/size so unchanged files are hashed once"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _file_hash(path: str) -> Optional[str]:
+    try:
+        stat = os.stat(path)
+        return _hash_file(path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def _pick(source: ImageSource) -> str:
+    """First existing candidate (the last one if none exist, so the send fails loudly)"""
+    if isinstance(source, str):
+        return source
+    for path in source:
+        if path and os.path.exists(path):
+            return path
+    return source[-1]
+
+
+async def _resolve(sources: list[ImageSource]) -> tuple[list, list[Optional[tuple[str, str]]], bool, list[str]]:
+    """Map images to file_id strings where known, FSInputFile otherwise; also returns the chosen paths"""
+    def pick_and_hash():
+        paths = [_pick(source) for source in sources]
+        return paths, [_file_hash(path) for path in paths]
+
+    paths, hashes = await asyncio.to_thread(pick_and_hash)
+    keys = [(path, digest) if digest else None for path, digest in zip(paths, hashes)]
+    known = await db.get_media_file_ids([key for key in keys if key])
+    media = []
+    for path, key in zip(paths, keys):
+        file_id = known.get(key) if key else None
+        media.append(file_id or FSInputFile(path))
+    return media, keys, bool(known), paths
+
+
+async def _remember(key: Optional[tuple[str, str]], used, message: Union[Message, bool, None]) -> None:
+    if not key or not isinstance(message, Message) or not message.photo:
+        return
+    if isinstance(used, str):
+        return  # sent by a cached file_id Telegram accepted: the registry is current
+    largest = message.photo[-1]
+    try:
+        await db.save_media_file_id(key[0], key[1], largest.file_id, largest.file_unique_id)
+    except Exception as e:
+        logger.error(f"Error saving file_id for {key[0]}: {e}")
+
+
+async def _forget(media: list) -> None:
+    stale = [item for item in media if isinstance(item, str)]
+    if stale:
+        logger.warning(f"Telegram rejected {len(stale)} cached file_id(s), re-uploading")
+        await db.forget_media_file_ids(stale)
+
+
+async def send_photo(bot: Bot, chat_id: Union[int, str], source: ImageSource, **kwargs) -> Message:
+    """bot.send_photo for a local image, reusing its file_id when known"""
+    (photo,), (key,), cached, (path,) = await _resolve([source])
+    try:
+        sent = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+    except TelegramBadRequest as e:
+        if not cached or not _is_file_id_error(e):
+            raise
+        await _forget([photo])
+        photo = FSInputFile(path)
+        sent = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+    await _remember(key, photo, sent)
+    return sent
+
+
+async def send_media_group(bot: Bot, chat_id: Union[int, str], sources: list[ImageSource],
+                           first_caption: Optional[str] = None, **kwargs) -> list[Message]:
+    """bot.send_media_group for local images, reusing file_ids when known"""
+    media, keys, cached, paths = await _resolve(sources)
+
+    def build(items):
+        return [
+            InputMediaPhoto(media=item, caption=first_caption if i == 0 else None)
+            for i, item in enumerate(items)
+        ]
+
+    try:
+        sent = await bot.send_media_group(chat_id=chat_id, media=build(media), **kwargs)
+    except TelegramBadRequest as e:
+        if not cached or not _is_file_id_error(e):
+            raise
+        await _forget(media)
+        media = [FSInputFile(path) for path in paths]
+        sent = await bot.send_media_group(chat_id=chat_id, media=build(media), **kwargs)
+    for key, used, message in zip(keys, media, sent):
+        await _remember(key, used, message)
+    return sent
+
+
+async def edit_photo(message: Message, source: ImageSource, caption: Optional[str] = None, **kwargs):
+    """message.edit_media with a local image, reusing its file_id when known"""
+    (photo,), (key,), cached, (path,) = await _resolve([source])
+    try:
+        edited = await message.edit_media(media=InputMediaPhoto(media=photo, caption=caption), **kwargs)
+    except TelegramBadRequest as e:
+        if not cached or not _is_file_id_error(e):
+            raise
+        await _forget([photo])
+        photo = FSInputFile(path)
+        edited = await message.edit_media(media=InputMediaPhoto(media=photo, caption=caption), **kwargs)
+    await _remember(key, photo, edited)
+    return edited
@@ -0,0 +1,176 @@
+"""
+Content-addressed media store
+Product images are stored once per distinct content, at
+<MEDIA_DIR>/<ab>/<cd>/<sha256><ext>, so re-uploads and images shared between
+products take no extra space. Unreferenced blobs are removed by the
+gc_media management command.
+"""
+import hashlib
+import os
+import re
+import time
+import uuid
+from typing import Iterator, Optional
+
+from config import app_config
+
+# Two levels of 256 directories keep every directory small
+SHARDS = [f"{i:02x}" for i in range(256)]
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$")
+
+
+class MediaStore:
+    """Sharded SHA-256 blob store rooted at a media directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{ext.lower()}")
+
+    def is_blob(self, path: str) -> bool:
+        """True for paths inside this store's shard directories"""
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        parts = rel.split(os.sep)
+        return (
+            len(parts) == 3 and parts[0] in SHARDS and
+            parts[2].startswith(parts[0] + parts[1]) and BLOB_NAME.match(parts[2]) is not None
+        )
+
+    def put_bytes(self, data: bytes, ext: str) -> str:
+        """Store bytes and return their path (existing content is reused)"""
+        path = self.path_for(hashlib.sha256(data).hexdigest(), ext)
+        if self._reuse(path):
+            return path
+        tmp_path = self.temp_path(ext)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self._commit(tmp_path, path)
+
+    def adopt(self, tmp_path: str) -> str:
+        """Move a finished file (e.g. from temp_path) into the store"""
+        sha = hashlib.sha256()
+        with open(tmp_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                sha.update(chunk)
+        path = self.path_for(sha.hexdigest(), os.path.splitext(tmp_path)[1])
+        if self._reuse(path):
+            os.remove(tmp_path)
+            return path
+        return self._commit(tmp_path, path)
+
+    def temp_path(self, ext: str) -> str:
+        """Scratch path on the store's filesystem, for atomic renames"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}{ext}")
+
+    def _reuse(self, path: str) -> bool:
+        # Refresh mtime so a blob shared by a new upload is not collected
+        # during the GC grace period, before the product referencing it is
+        # saved. A failed touch means the blob is gone (or being collected),
+        # so the caller writes a fresh copy.
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def _commit(self, tmp_path: str, path: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)  # atomic; a concurrent identical write is harmless
+        return path
+
+    def remove_if_stale(self, path: str, cutoff: float) -> Optional[int]:
+        """
+        Delete a blob last touched before cutoff; returns the bytes freed, or None if kept
+
+        The blob is first renamed aside, so a concurrent _reuse either touched
+        it before the rename (its new mtime is seen here and it is put back)
+        or fails to touch it afterwards and writes a fresh copy.
+        """
+        if os.stat(path).st_mtime >= cutoff:
+            return None
+        doomed = self.temp_path(os.path.splitext(path)[1])  # swept by sweep_tmp if we crash
+        os.rename(path, doomed)
+        stat = os.stat(doomed)
+        if stat.st_mtime >= cutoff:
+            os.replace(doomed, path)  # same content, so overwriting a new copy is harmless
+            return None
+        os.remove(doomed)
+        return stat.st_size
+
+    def iter_shard(self, shard: str) -> Iterator[str]:
+        """Blob paths under one top-level shard directory"""
+        shard_dir = os.path.join(self.root, shard)
+        if not os.path.isdir(shard_dir):
+            return
+        for sub in sorted(os.listdir(shard_dir)):
+            sub_dir = os.path.join(shard_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in sorted(os.listdir(sub_dir)):
+                path = os.path.join(sub_dir, name)
+                if self.is_blob(path):
+                    yield path
+
+    def iter_legacy(self) -> Iterator[str]:
+        """Files from before the store (flat in the media root)"""
+        if not os.path.isdir(self.root):
+            return
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if os.path.isfile(path) and not name.startswith("."):
+                yield path
+
+    def sweep_tmp(self, min_age: float) -> int:
+        """Remove scratch files left behind by crashed writes"""
+        if not os.path.isdir(self.tmp_dir):
+            return 0
+        removed = 0
+        cutoff = time.time() - min_age
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def product_media_paths(product) -> set[str]:
+    """Every file a product refers to"""
+    return media_paths(
+        product.image_path, product.original_image_path,
+        product.image_variants, product.category_fields,
+    )
+
+
+def media_paths(image_path, original_image_path, image_variants, category_fields) -> set[str]:
+    """Every file referenced by a product's image fields"""
+    paths = {image_path, original_image_path}
+    paths.update((image_variants or {}).values())
+    gallery = (category_fields or {}).get("_gallery_images")
+    if isinstance(gallery, list):
+        paths.update(gallery)
+    return {path for path in paths if isinstance(path, str) and path}
+
+
+def release_legacy(paths) -> None:
+    """
+    Delete pre-store files a removed product owned outright
+
+    Store blobs may be shared with other products, so they are left for
+    gc_media, which only removes them once nothing references them.
+    """
+    for path in paths:
+        if path and not media_store.is_blob(path) and os.path.isfile(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+media_store = MediaStore(app_config.MEDIA_DIR)
@@ -0,0 +1,281 @@
+"""
+Outbound Telegram rate limiting
+Session middleware shared by every sender: token buckets for the bot and
+for each chat, priority lanes (user replies before bulk channel work) and
+automatic TelegramRetryAfter backoff
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, AnswerInlineQuery
+
+from config import app_config
+from utils.logger import logger
+
+# Lanes: lower value is served first
+INTERACTIVE = 0
+BULK = 1
+LANE_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+_priority: ContextVar[int] = ContextVar('outbound_priority', default=INTERACTIVE)
+
+# Answers to callbacks/inline queries are not chat messages and are not rate limited
+UNLIMITED_METHODS = (AnswerCallbackQuery, AnswerInlineQuery)
+
+
+@contextmanager
+def outbound_priority(lane: int):
+    """Send everything inside the block (and tasks it spawns) on the given lane"""
+    token = _priority.set(lane)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Classic token bucket; ``pause`` blocks it until a retry-after expires.
+    Thread-safe: check-and-take is one locked step, so callers on different
+    threads cannot both spend the last token.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_time(self, now: float) -> float:
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        with self._lock:
+            return self._wait_time(now)
+
+    def try_take(self) -> float:
+        """Take a token if one is available (returns 0), else the seconds to wait"""
+        with self._lock:
+            wait = self._wait_time(time.monotonic())
+            if wait <= 0:
+                self.tokens -= 1
+            return wait
+
+    def is_idle(self) -> bool:
+        """Full and not paused (a fresh bucket would be the same)"""
+        with self._lock:
+            return self._wait_time(time.monotonic()) == 0 and self.tokens >= self.capacity
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class _Waiter:
+    """A call queued for a bot-wide token, ordered by (lane, arrival)"""
+    __slots__ = ('lane', 'seq', 'future', 'loop', 'done')
+
+    def __init__(self, lane: int, seq: int, loop: asyncio.AbstractEventLoop):
+        self.lane = lane
+        self.seq = seq
+        self.loop = loop
+        self.future = loop.create_future()
+        self.done = False
+
+    def __lt__(self, other: '_Waiter') -> bool:
+        return (self.lane, self.seq) < (other.lane, other.seq)
+
+    def wake(self) -> None:
+        """Tell the waiter it is at the head (safe from any thread or loop)"""
+        def _set():
+            if not self.future.done():
+                self.future.set_result(None)
+        try:
+            self.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            pass  # its loop is gone, and the waiter with it
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """
+    Request middleware that paces outgoing Telegram calls.
+
+    Each call waits for a token from its chat's bucket, then from the
+    bot-wide bucket. Bot-wide tokens are handed out by (lane, arrival), so an
+    interactive reply never queues behind a burst of bulk channel edits.
+    Only the head of that queue sleeps on the bucket; the others wait on a
+    future the previous head resolves through its loop's call_soon_threadsafe,
+    so waiters on different event loops (polling, per-request webhook loops,
+    the update queue thread) can share one limiter. Bucket take/pause and
+    the chat bucket map are lock-protected for the same reason.
+
+    Private chats get a small burst (``private_burst``) so a multi-message
+    reply is not paced one call per second. A flood-control retry sleeps
+    inside the sending handler, so retries stop once their combined
+    retry_after would exceed ``max_retry_wait`` seconds.
+
+    Limits are enforced per process. The module-level limiter divides the
+    bot-wide rate by OUTBOUND_PROCESSES (uvicorn's WEB_CONCURRENCY), so N
+    workers together stay within it; per-chat rates are not divided, so a
+    chat whose updates land on several workers can get up to N times its
+    rate (Telegram then answers with retry_after, which is honoured).
+    """
+
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(self, global_rate: float, private_rate: float, group_rate: float,
+                 max_retries: int = 3, private_burst: float = 1, max_retry_wait: float = 30):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.private_burst = private_burst
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self._chat_buckets: dict[object, TokenBucket] = {}
+        self._waiters: list[_Waiter] = []
+        self._waiters_lock = threading.Lock()
+        # Guards the chat bucket map and the queue-depth counters
+        self._buckets_lock = threading.Lock()
+        self._seq = itertools.count()
+        self.sent = 0
+        self.retries = 0
+        self.max_wait = 0.0
+        self._depth = {lane: 0 for lane in LANE_NAMES}
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, UNLIMITED_METHODS):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        attempt = 0
+        waited = 0.0
+        while True:
+            await self._acquire(chat_id, _priority.get())
+            try:
+                response = await make_request(bot, method)
+                with self._buckets_lock:
+                    self.sent += 1
+                return response
+            except TelegramRetryAfter as e:
+                attempt += 1
+                with self._buckets_lock:
+                    self.retries += 1
+                waited += e.retry_after
+                bucket = self._chat_bucket(chat_id)
+                (bucket or self.global_bucket).pause(e.retry_after)
+                if attempt > self.max_retries or waited > self.max_retry_wait:
+                    raise
+                logger.warning(
+                    f"Flood control on {type(method).__name__} to {chat_id}: "
+                    f"retrying in {e.retry_after}s (attempt {attempt})"
+                )
+
+    async def _acquire(self, chat_id, lane: int) -> None:
+        with self._buckets_lock:
+            self._depth[lane] += 1
+        started = time.monotonic()
+        ticket = None
+        try:
+            # Per-chat pacing first, so a slow channel never blocks other chats
+            chat_bucket = self._chat_bucket(chat_id)
+            if chat_bucket is not None:
+                while (wait := chat_bucket.try_take()) > 0:
+                    await asyncio.sleep(wait)
+
+            # Then the bot-wide bucket, served in (lane, arrival) order
+            ticket = _Waiter(lane, next(self._seq), asyncio.get_running_loop())
+            with self._waiters_lock:
+                heapq.heappush(self._waiters, ticket)
+                at_head = self._waiters[0] is ticket
+            if not at_head:
+                await ticket.future
+            while (wait := self.global_bucket.try_take()) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            if ticket is not None:
+                self._release(ticket)
+            with self._buckets_lock:
+                self._depth[lane] -= 1
+                self.max_wait = max(self.max_wait, time.monotonic() - started)
+
+    def _release(self, ticket: _Waiter) -> None:
+        """Retire a waiter (served or cancelled) and wake the next head"""
+        with self._waiters_lock:
+            ticket.done = True
+            # Retired waiters below the head are dropped lazily as they surface
+            while self._waiters and self._waiters[0].done:
+                heapq.heappop(self._waiters)
+            head = self._waiters[0] if self._waiters else None
+        if head is not None:
+            head.wake()
+
+    def _chat_bucket(self, chat_id) -> Optional[TokenBucket]:
+        if chat_id is None:
+            return None  # inline message edits: only the bot-wide limit applies
+        with self._buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                # Private chats have positive ids; groups, channels and @usernames are shared chats
+                private = isinstance(chat_id, int) and chat_id > 0
+                rate = self.private_rate if private else self.group_rate
+                burst = self.private_burst if private else 1.0
+                bucket = TokenBucket(rate, max(burst, rate))
+                if len(self._chat_buckets) >= self.MAX_TRACKED_CHATS:
+                    self._prune_idle()
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def _prune_idle(self) -> None:
+        """Forget chats whose bucket has refilled (they would start full anyway); caller holds _buckets_lock"""
+        idle = [chat for chat, bucket in self._chat_buckets.items() if bucket.is_idle()]
+        for chat in idle:
+            del self._chat_buckets[chat]
+
+    def stats(self) -> dict:
+        """Queue depth and throughput metrics"""
+        with self._buckets_lock:
+            return {
+                'queue_depth': {LANE_NAMES[lane]: depth for lane, depth in self._depth.items()},
+                'sent': self.sent,
+                'retry_after': self.retries,
+                'max_wait_seconds': round(self.max_wait, 3),
+                'tracked_chats': len(self._chat_buckets),
+            }
+
+
+# One limiter per process, installed on every Bot session
+outbound_limiter = OutboundLimiter(
+    global_rate=app_config.OUTBOUND_GLOBAL_RATE / max(1, app_config.OUTBOUND_PROCESSES),
+    private_rate=app_config.OUTBOUND_CHAT_RATE,
+    group_rate=app_config.OUTBOUND_GROUP_RATE,
+    max_retries=app_config.OUTBOUND_MAX_RETRIES,
+    private_burst=app_config.OUTBOUND_CHAT_BURST,
+    max_retry_wait=app_config.OUTBOUND_MAX_RETRY_WAIT,
+)
+
+
+def install_outbound_limiter(bot) -> None:
+    """Attach the shared limiter to a bot's session (idempotent)"""
+    if outbound_limiter not in bot.session.middleware:
+        bot.session.middleware(outbound_limiter)
@@ -0,0 +1,189 @@
+"""
+Per-update database query budget
+Counts the queries and DB time each Telegram update costs, logs handlers
+that go over budget and flags repeated query shapes as N+1 candidates
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from config import app_config
+from utils.logger import logger
+
+
+@dataclass
+class QueryStats:
+    """Queries issued while handling one update"""
+    label: str
+    count: int = 0
+    seconds: float = 0.0
+    # SQL template (placeholders, not values) -> times executed
+    shapes: Counter = field(default_factory=Counter)
+    # Handlers may run queries from several sync_to_async threads at once
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, sql: str, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.shapes[sql] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+
+# Set by the update middleware; sync_to_async copies the context into its
+# worker thread, so the DB instrument sees the same object
+_current: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+
+def _instrument(execute, sql, params, many, context):
+    """connection.execute_wrapper hook"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, time.perf_counter() - started)
+
+
+def _attach(sender=None, connection=None, **kwargs) -> None:
+    if _instrument not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_instrument)
+
+
+class QueryBudget:
+    """Aggregated per-handler query metrics"""
+
+    def __init__(self, max_queries: int, max_ms: float, repeat_threshold: int):
+        self.max_queries = max_queries
+        self.max_ms = max_ms
+        self.repeat_threshold = repeat_threshold
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.over_budget = 0
+        self.n_plus_one = 0
+        self._handlers: dict[str, dict] = defaultdict(
+            lambda: {'updates': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0, 'over_budget': 0}
+        )
+
+    def record(self, stats: QueryStats) -> None:
+        over = (
+            (self.max_queries and stats.count > self.max_queries) or
+            (self.max_ms and stats.seconds * 1000 > self.max_ms)
+        )
+        repeated = stats.repeated(self.repeat_threshold) if self.repeat_threshold else []
+
+        with self._lock:
+            self.updates += 1
+            self.queries += stats.count
+            self.db_seconds += stats.seconds
+            handler = self._handlers[stats.label]
+            handler['updates'] += 1
+            handler['queries'] += stats.count
+            handler['db_ms'] += stats.seconds * 1000
+            handler['max_queries'] = max(handler['max_queries'], stats.count)
+            if over:
+                self.over_budget += 1
+                handler['over_budget'] += 1
+            if repeated:
+                self.n_plus_one += 1
+
+        if over:
+            logger.warning(
+                f"Query budget exceeded by {stats.label}: {stats.count} queries, "
+                f"{stats.seconds * 1000:.0f}ms (budget {self.max_queries} / {self.max_ms:.0f}ms)"
+            )
+        for sql, times in repeated:
+            logger.warning(f"Possible N+1 in {stats.label}: {times}x {sql[:200]}")
+
+    def stats(self, top: int = 10) -> dict:
+        """Totals plus the handlers with the most queries per update"""
+        with self._lock:
+            handlers = sorted(
+                self._handlers.items(),
+                key=lambda item: item[1]['queries'] / item[1]['updates'],
+                reverse=True
+            )[:top]
+            return {
+                'updates': self.updates,
+                'queries': self.queries,
+                'db_seconds': round(self.db_seconds, 3),
+                'over_budget': self.over_budget,
+                'n_plus_one_updates': self.n_plus_one,
+                'handlers': {
+                    label: {**values, 'db_ms': round(values['db_ms'], 1)}
+                    for label, values in handlers
+                },
+            }
+
+
+query_budget = QueryBudget(
+    max_queries=app_config.QUERY_BUDGET,
+    max_ms=app_config.QUERY_TIME_BUDGET_MS,
+    repeat_threshold=app_config.QUERY_REPEAT_THRESHOLD,
+)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """Outer update middleware: opens a QueryStats for the update and records it"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = QueryStats(label=getattr(event, 'event_type', None) or type(event).__name__)
+        token = _current.set(stats)
+        try:
+            return await handler(event, data)
+        finally:
+            _current.reset(token)
+            query_budget.record(stats)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Inner middleware: names the update's stats after the handler that matched"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = _current.get()
+        handler_object = data.get('handler')
+        if stats is not None and handler_object is not None:
+            callback = handler_object.callback
+            stats.label = f"{callback.__module__}.{getattr(callback, '__qualname__', callback)}"
+        return await handler(event, data)
+
+
+_update_middleware = QueryBudgetMiddleware()
+_label_middleware = HandlerLabelMiddleware()
+
+
+def install_query_budget(dp: Dispatcher) -> None:
+    """Instrument DB connections and attach the middlewares to a dispatcher (idempotent)"""
+    connection_created.connect(_attach, dispatch_uid='query_budget_instrument')
+    for connection in connections.all(initialized_only=True):
+        _attach(connection=connection)
+
+    if _update_middleware not in dp.update.outer_middleware:
+        dp.update.outer_middleware(_update_middleware)
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error') and _label_middleware not in observer.middleware:
+            observer.middleware(_label_middleware)
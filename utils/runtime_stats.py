@@ -0,0 +1,44 @@
+"""
+Runtime statistics
+Collects the counters kept by the caches, limiters and queues of this
+process into one snapshot (served by the admin /perf command)
+"""
+import os
+import time
+
+from database.counters import counter_buffer
+from utils.carousel_cache import carousel_cache
+from utils.edit_coalescer import keyboard_edits
+from utils.image_pool import image_pool
+from utils.ingest import ingest_stats
+from utils.inline_cache import inline_cache
+from utils.outbound import outbound_limiter
+from utils.query_budget import query_budget
+from utils.update_dedup import update_dedup
+from utils.update_queue import update_queue
+
+_started = time.time()
+
+SOURCES = {
+    'queries': query_budget,
+    'outbound': outbound_limiter,
+    'update_dedup': update_dedup,
+    'update_queue': update_queue,
+    'counters': counter_buffer,
+    'keyboard_edits': keyboard_edits,
+    'inline_cache': inline_cache,
+    'carousel_cache': carousel_cache,
+    'image_pool': image_pool,
+    'ingest': ingest_stats,
+}
+
+
+def collect() -> dict:
+    """Snapshot of every component's stats() for this process"""
+    snapshot = {'pid': os.getpid(), 'uptime_seconds': round(time.time() - _started)}
+    for name, source in SOURCES.items():
+        try:
+            snapshot[name] = source.stats()
+        except Exception as e:
+            snapshot[name] = {'error': str(e)}
+    return snapshot
@@ -0,0 +1,140 @@
+"""
+Update deduplication
+Telegram redelivers an update when the webhook is slow or fails; this drops
+update_ids that were already seen so likes, orders and posts run once
+"""
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+from config import app_config
+from database.db import db
+from utils.logger import logger
+
+
+class UpdateDeduplicator:
+    """
+    Ring of the last ``size`` update_ids (deque for order, set for O(1) lookup).
+
+    With ``shared`` on, ids are also claimed in the processed_updates table,
+    whose primary key makes the claim atomic across worker processes, so
+    redeliveries landing on another worker are dropped too. Claims older
+    than ``ttl_seconds`` are pruned every ``prune_every`` claims.
+    """
+
+    def __init__(self, size: int, shared: bool = False, ttl_seconds: int = 3600,
+                 prune_every: int = 1000):
+        self.size = max(1, size)
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = max(1, prune_every)
+        self._order: deque[int] = deque()
+        self._seen: set[int] = set()
+        self._lock = threading.Lock()
+        self._claims_since_prune = 0
+        self.checked = 0
+        self.dropped = 0
+        self.released = 0
+
+    def _claim_local(self, update_id: int) -> bool:
+        with self._lock:
+            self.checked += 1
+            if update_id in self._seen:
+                self.dropped += 1
+                return False
+            self._seen.add(update_id)
+            self._order.append(update_id)
+            if len(self._order) > self.size:
+                self._seen.discard(self._order.popleft())
+            return True
+
+    async def claim(self, update_id: int) -> bool:
+        """True the first time an update_id is seen, False for redeliveries"""
+        if not self._claim_local(update_id):
+            return False
+        if not self.shared:
+            return True
+        try:
+            added = await db.claim_update(update_id)
+        except Exception as e:
+            # Shared store unavailable: the local ring still covers this process
+            logger.error(f"Update dedup claim error: {e}")
+            return True
+        with self._lock:
+            if not added:
+                self.dropped += 1
+            self._claims_since_prune += 1
+            prune = self._claims_since_prune >= self.prune_every
+            if prune:
+                self._claims_since_prune = 0
+        if prune:
+            try:
+                await db.prune_processed_updates(self.ttl_seconds)
+            except Exception as e:
+                logger.error(f"Update dedup prune error: {e}")
+        return added
+
+    async def release(self, update_id: int) -> None:
+        """Undo a claim (the handler failed), so a redelivery is handled again"""
+        with self._lock:
+            self.released += 1
+            if update_id in self._seen:
+                self._seen.discard(update_id)
+                self._order.remove(update_id)
+        if not self.shared:
+            return
+        try:
+            await db.release_update(update_id)
+        except Exception as e:
+            logger.error(f"Update dedup release error: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'tracked': len(self._seen),
+                'checked': self.checked,
+                'dropped': self.dropped,
+                'released': self.released,
+                'shared': self.shared,
+            }
+
+
+update_dedup = UpdateDeduplicator(
+    size=app_config.UPDATE_DEDUP_SIZE,
+    shared=app_config.UPDATE_DEDUP_SHARED,
+    ttl_seconds=app_config.UPDATE_DEDUP_TTL,
+)
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """Outer update middleware: skips updates whose id was already handled"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_id = getattr(event, 'update_id', None)
+        if update_id is None:
+            return await handler(event, data)
+        if not await update_dedup.claim(update_id):
+            logger.info(f"Dropping redelivered update {update_id}")
+            return None
+        try:
+            return await handler(event, data)
+        except Exception:
+            await update_dedup.release(update_id)
+            raise
+
+
+_middleware = UpdateDedupMiddleware()
+
+
+def install_update_dedup(dp: Dispatcher) -> None:
+    """Attach the dedup middleware to a dispatcher (idempotent); install it first"""
+    if _middleware not in dp.update.outer_middleware:
+        dp.update.outer_middleware(_middleware)
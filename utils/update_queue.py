@@ -0,0 +1,233 @@
+"""
+Webhook update queue
+Lets the webhook view acknowledge Telegram immediately: updates are handed
+to async workers (tasks on the ASGI server loop, or on a dedicated event
+loop thread under WSGI), with one lane per chat so each chat's updates are
+processed in order
+"""
+import asyncio
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from config import app_config
+from utils.edit_coalescer import keyboard_edits
+from utils.logger import logger
+
+# Builds (bot, dispatcher) on the worker loop, so the bot's HTTP session
+# belongs to the loop that uses it
+BotFactory = Callable[[], Awaitable[tuple]]
+
+
+def chat_key(update) -> int:
+    """Ordering key: the chat (or user) an update belongs to"""
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+    chat = getattr(event, 'chat', None)
+    if chat is not None:
+        return chat.id
+    message = getattr(event, 'message', None)
+    if message is not None and getattr(message, 'chat', None) is not None:
+        return message.chat.id
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Bounded queue of Telegram updates, processed in order per chat.
+
+    ``submit`` may be called from any thread or event loop and never
+    blocks: it returns False when ``max_size`` updates are already waiting,
+    so the view can answer 503 and Telegram retries later.
+
+    Every chat (``chat_key``) gets its own FIFO lane, drained by a single
+    task, so a chat's updates are handled one at a time and in order. At
+    most ``workers`` updates are handled at once across all lanes. A slow
+    handler therefore only holds up later updates from its own chat (and
+    one of the ``workers`` slots); other chats keep moving unless every
+    slot is taken by slow handlers.
+
+    Under ASGI the lifespan calls ``start_on_loop`` with its bot and
+    dispatcher, and the workers run as tasks on the server loop. Otherwise
+    ``start`` runs them on a thread with its own loop and bot.
+    """
+
+    def __init__(self, workers: int, max_size: int):
+        self.workers = max(1, workers)
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lanes: dict[int, deque] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._accepting = False
+        self._on_loop = False
+        # The workers' bot, for mounting updates before they are queued
+        self.bot = None
+        self._dp = None
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.max_wait = 0.0
+        self.max_lanes = 0
+
+    @property
+    def running(self) -> bool:
+        if self._on_loop:
+            return self._accepting
+        return self._thread is not None and self._thread.is_alive()
+
+    def start_on_loop(self, bot, dp) -> None:
+        """Run the workers as tasks on the running loop, sending through ``bot``"""
+        self._on_loop = True
+        self._begin(asyncio.get_running_loop(), bot, dp)
+
+    async def aclose(self) -> None:
+        """Stop accepting and wait for queued updates (pairs with start_on_loop)"""
+        with self._lock:
+            self._accepting = False
+        await self._finish()
+
+    def start(self, factory: BotFactory) -> None:
+        """Start the worker thread (idempotent); waits until workers are up"""
+        with self._lock:
+            if not self.running:
+                self._ready.clear()
+                self._thread = threading.Thread(
+                    target=self._run, args=(factory,), name='webhook-update-workers', daemon=True
+                )
+                self._thread.start()
+                atexit.unregister(self.stop)
+                atexit.register(self.stop)
+        # Callers that found the thread already starting wait here too
+        if not self._ready.wait(timeout=30) or not self._accepting:
+            raise RuntimeError("Webhook update workers did not start")
+
+    def submit(self, update) -> bool:
+        """Queue an update; False means the queue is full (apply backpressure)"""
+        with self._lock:
+            if not self._accepting or self._depth >= self.max_size:
+                self.rejected += 1
+                return False
+            self._depth += 1
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._depth)
+        self._loop.call_soon_threadsafe(self._push, chat_key(update), (time.monotonic(), update))
+        return True
+
+    def _push(self, key: int, item: tuple) -> None:
+        """Append to the chat's lane, starting a drain task if it is idle (loop thread)"""
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self.max_lanes = max(self.max_lanes, len(self._lanes))
+            task = asyncio.create_task(self._drain(key, lane))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        lane.append(item)
+
+    async def _drain(self, key: int, lane: deque) -> None:
+        try:
+            while lane:
+                queued_at, update = lane.popleft()
+                async with self._slots:
+                    self.max_wait = max(self.max_wait, time.monotonic() - queued_at)
+                    await self._process(update)
+        finally:
+            # No await since the last emptiness check, so no item can be lost
+            del self._lanes[key]
+
+    async def _process(self, update) -> None:
+        try:
+            await self._dp.feed_update(self.bot, update)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error processing update {update.update_id}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._depth -= 1
+
+    def _run(self, factory: BotFactory) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._serve(loop, factory))
+        except Exception as e:
+            logger.error(f"Webhook update workers stopped: {e}")
+        finally:
+            with self._lock:
+                self._accepting = False
+            self._ready.set()
+            loop.close()
+
+    async def _serve(self, loop: asyncio.AbstractEventLoop, factory: BotFactory) -> None:
+        bot, dp = await factory()
+        self._begin(loop, bot, dp)
+        self._ready.set()
+        try:
+            await self._stopping.wait()
+            await self._finish()
+        finally:
+            await bot.session.close()
+
+    def _begin(self, loop: asyncio.AbstractEventLoop, bot, dp) -> None:
+        self.bot, self._dp = bot, dp
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.workers)
+        self._stopping = asyncio.Event()
+        keyboard_edits.register_loop()
+        with self._lock:
+            self._accepting = True
+        logger.info(f"✅ Webhook update queue started with {self.workers} workers")
+
+    async def _finish(self) -> None:
+        # Let every queued update finish
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop accepting, let queued updates drain, then stop the workers"""
+        with self._lock:
+            self._accepting = False
+        if self._on_loop or not self.running:
+            return
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth = self._depth
+        return {
+            'workers': self.workers,
+            'depth': depth,
+            'active_chats': len(self._lanes),
+            'max_active_chats': self.max_lanes,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'processed': self.processed,
+            'failed': self.failed,
+            'max_wait_seconds': round(self.max_wait, 3),
+        }
+
+
+# One per process; started by the ASGI lifespan (or, under WSGI, by the
+# webhook view) when WEBHOOK_QUEUE is on
+update_queue = UpdateQueue(
+    workers=app_config.WEBHOOK_WORKERS,
+    max_size=app_config.WEBHOOK_QUEUE_SIZE,
+)
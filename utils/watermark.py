@@ -3,12 +3,165 @@ Image watermarking utility
 Adds store name watermark to product images
 """
 import os
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 from config import app_config
+from utils.image_pool import image_pool
 
 async def add_watermark(image_path: str, store_name: str, output_path: str = None) -> str:
     """
     Add watermark to image with store name
+    Runs in the shared image pool so the event loop is never blocked.
+    
+    Args:
+        image_path: Path to original image
+        store_name: Store name to use as watermark
+        output_path: Optional output path, defaults to same as input
+    
+    Returns:
+        Path to watermarked image (the original path if watermarking failed)
+    """
+    try:
+        return await image_pool.run(watermark_image, image_path, store_name, output_path)
+    except Exception as e:
+        print(f"Error adding watermark to {image_path}: {e}")
+        return image_path
+
+# Label tiles are small (text plus background box); a few hundred cover
+# every active store at the handful of font sizes real photos produce
+LABEL_CACHE_SIZE = 256
+
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+    "C:\\Windows\\Fonts\\arial.ttf"
+]
+
+# Distance of the text from the image edge, and of the box around the text
+PADDING = 20
+BG_PADDING = 10
+
+@lru_cache(maxsize=1)
+def _font_path():
+    """First available system font (probed once per process)"""
+    for font_path in FONT_PATHS:
+        if os.path.exists(font_path):
+            return font_path
+    return None
+
+@lru_cache(maxsize=64)
+def _load_font(font_size: int):
+    """TrueType font at the given size, falling back to Pillow's default"""
+    font_path = _font_path()
+    if font_path:
+        try:
+            return ImageFont.truetype(font_path, font_size)
+        except Exception:
+            pass
+    return ImageFont.load_default()
+
+def _font_size(img_width: int) -> int:
+    """Font size scaled to image width, clamped so it's never too big or small"""
+    base_size = int(img_width * 0.04)
+    min_size = app_config.WATERMARK_FONT_SIZE
+    max_size = int(img_width * 0.07)
+    return max(min_size, min(base_size, max_size))
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def _label_tile(store_name: str, font_size: int, opacity: int):
+    """
+    Rendered watermark label: text on a semi-transparent box
+    
+    Returns (tile, text_width, text_height). The tile's origin is the top-left
+    corner of the background box; it is shared between calls and must not be
+    modified.
+    """
+    font = _load_font(font_size)
+    watermark_text = f"{store_name} x @ethiostorebot"
+    
+    bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), watermark_text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    
+    # Glyphs can reach past the measured box by the bbox offset, so size the
+    # tile to hold both the box and the drawn text
+    box_width = text_width + 2 * BG_PADDING
+    box_height = text_height + 2 * BG_PADDING
+    tile = Image.new(
+        'RGBA',
+        (max(box_width + 1, BG_PADDING + bbox[2]), max(box_height + 1, BG_PADDING + bbox[3])),
+        (255, 255, 255, 0)
+    )
+    draw = ImageDraw.Draw(tile)
+    draw.rectangle([0, 0, box_width, box_height], fill=(0, 0, 0, 120))
+    draw.text((BG_PADDING, BG_PADDING), watermark_text, font=font, fill=(255, 255, 255, opacity))
+    return tile, text_width, text_height
+
+def stamp_watermark(image, store_name: str):
+    """
+    Composite the cached label onto the bottom-right corner of an RGB/RGBA image
+    
+    Works in place and only touches the label's footprint, so no full-frame
+    overlay is allocated.
+    """
+    img_width, img_height = image.size
+    tile, text_width, text_height = _label_tile(
+        store_name, _font_size(img_width), app_config.WATERMARK_OPACITY
+    )
+    
+    # Top-left of the background box, clipped to the image
+    left = img_width - text_width - PADDING - BG_PADDING
+    top = img_height - text_height - PADDING - BG_PADDING
+    src_left, src_top = max(0, -left), max(0, -top)
+    box = (
+        max(0, left),
+        max(0, top),
+        min(img_width, left + tile.width),
+        min(img_height, top + tile.height)
+    )
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return
+    label = tile.crop((src_left, src_top, src_left + box[2] - box[0], src_top + box[3] - box[1]))
+    
+    region = image.crop(box)
+    if region.mode != 'RGBA':
+        region = region.convert('RGBA')
+    region.alpha_composite(label)
+    image.paste(region if image.mode == 'RGBA' else region.convert(image.mode), box[:2])
+
+def save_image(image, output_path: str, original_format: str = None) -> str:
+    """
+    Save a watermarked image, preserving the original format and quality
+    
+    Returns the path written, which gets a .jpg extension for formats that
+    are re-encoded as JPEG.
+    """
+    ext = os.path.splitext(output_path)[1].lower()
+    if original_format in ['JPEG', 'JPG'] or ext in ['.jpg', '.jpeg']:
+        # For JPEG, convert to RGB and save with high quality
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(output_path, format='JPEG', quality=95, optimize=False)
+    elif original_format == 'PNG' or ext == '.png':
+        # For PNG, preserve transparency
+        image.save(output_path, format='PNG', optimize=False)
+    elif original_format == 'WEBP' or ext == '.webp':
+        # For WebP, convert to RGB if needed and save with high quality
+        if image.mode == 'RGBA':
+            # WebP supports transparency, but we'll convert to RGB for compatibility
+            image = image.convert('RGB')
+        image.save(output_path, format='WEBP', quality=95, optimize=False)
+    else:
+        # Fallback: convert to RGB and save as JPEG
+        image = image.convert('RGB')
+        output_path = os.path.splitext(output_path)[0] + '.jpg'
+        image.save(output_path, format='JPEG', quality=95, optimize=False)
+    return output_path
+
+def watermark_image(image_path: str, store_name: str, output_path: str = None) -> str:
+    """
+    Add watermark to image with store name (blocking)
     Preserves original image quality and format.
     
     Args:
@@ -21,88 +174,22 @@ async def add_watermark(image_path: str, store_name: str, output_path: str = Non
     """
     img = None
     image = None
-    txt_layer = None
-    watermarked = None
     
     try:
         # Open image
         img = Image.open(image_path)
         img.load()  # Load image data to handle potential truncation
         
-        # Convert to RGBA if not already
-        if img.mode != 'RGBA':
-            image = img.convert('RGBA')
-        else:
+        # RGB and RGBA are stamped in place; other modes (palette, greyscale...) go via RGBA
+        if img.mode in ('RGB', 'RGBA'):
             image = img.copy()
+        else:
+            image = img.convert('RGBA')
         
         if image is None:
             raise ValueError("Failed to load or convert image")
         
-        # Create transparent overlay
-        txt_layer = Image.new('RGBA', image.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(txt_layer)
-        
-        # Calculate font size based on image width
-        img_width, img_height = image.size
-        # Base size as a fraction of width
-        base_size = int(img_width * 0.04)
-        # Clamp font size so it doesn't look too big or too small
-        min_size = app_config.WATERMARK_FONT_SIZE
-        max_size = int(img_width * 0.07)
-        font_size = max(min_size, min(base_size, max_size))
-        
-        # Try to load a font, fallback to default
-        try:
-            # Try common system fonts
-            font_paths = [
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-                "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
-                "/System/Library/Fonts/Helvetica.ttc",
-                "C:\\Windows\\Fonts\\arial.ttf"
-            ]
-            
-            font = None
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    font = ImageFont.truetype(font_path, font_size)
-                    break
-            
-            if font is None:
-                font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
-        
-        # Prepare watermark text
-        watermark_text = f"{store_name} x @ethiostorebot"
-        
-        # Get text bounding box
-        bbox = draw.textbbox((0, 0), watermark_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Position watermark at bottom-right with padding
-        padding = 20
-        x = img_width - text_width - padding
-        y = img_height - text_height - padding
-        
-        # Draw semi-transparent background rectangle
-        bg_padding = 10
-        draw.rectangle(
-            [x - bg_padding, y - bg_padding, 
-             x + text_width + bg_padding, y + text_height + bg_padding],
-            fill=(0, 0, 0, 120)
-        )
-        
-        # Draw watermark text
-        draw.text(
-            (x, y),
-            watermark_text,
-            font=font,
-            fill=(255, 255, 255, app_config.WATERMARK_OPACITY)
-        )
-        
-        # Composite the watermark onto the original image
-        watermarked = Image.alpha_composite(image, txt_layer)
+        stamp_watermark(image, store_name)
         
         # Determine original format and extension
         original_format = img.format
@@ -115,25 +202,7 @@ async def add_watermark(image_path: str, store_name: str, output_path: str = Non
             if not output_ext:
                 output_path = output_path + original_ext
         
-        # Save watermarked image preserving original format and quality
-        if original_format in ['JPEG', 'JPG'] or os.path.splitext(output_path)[1].lower() in ['.jpg', '.jpeg']:
-            # For JPEG, convert to RGB and save with high quality
-            watermarked = watermarked.convert('RGB')
-            watermarked.save(output_path, quality=95, optimize=False)
-        elif original_format == 'PNG' or os.path.splitext(output_path)[1].lower() == '.png':
-            # For PNG, preserve transparency
-            watermarked.save(output_path, optimize=False)
-        elif original_format == 'WEBP' or os.path.splitext(output_path)[1].lower() == '.webp':
-            # For WebP, convert to RGB if needed and save with high quality
-            if watermarked.mode == 'RGBA':
-                # WebP supports transparency, but we'll convert to RGB for compatibility
-                watermarked = watermarked.convert('RGB')
-            watermarked.save(output_path, quality=95, optimize=False)
-        else:
-            # Fallback: convert to RGB and save as JPEG
-            watermarked = watermarked.convert('RGB')
-            output_path = os.path.splitext(output_path)[0] + '.jpg'
-            watermarked.save(output_path, quality=95, optimize=False)
+        output_path = save_image(image, output_path, original_format)
         
         return output_path
     
@@ -147,10 +216,6 @@ async def add_watermark(image_path: str, store_name: str, output_path: str = Non
             img.close()
         if image is not None:
             image.close()
-        if txt_layer is not None:
-            txt_layer.close()
-        if watermarked is not None:
-            watermarked.close()
 
 def create_thumbnail(image_path: str, max_size: tuple = (800, 800)) -> str:
     """
@@ -168,7 +233,8 @@ def create_thumbnail(image_path: str, max_size: tuple = (800, 800)) -> str:
         image.thumbnail(max_size, Image.Resampling.LANCZOS)
         
         # Save thumbnail
-        thumb_path = image_path.replace('.', '_thumb.')
+        base, ext = os.path.splitext(image_path)
+        thumb_path = f"{base}_thumb{ext or '.jpg'}"
         image.save(thumb_path, quality=85, optimize=True)
         
         return thumb_path